@@ -0,0 +1,80 @@
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+# config.json and the site definitions are looked up relative to the repository root
+os.chdir(ROOT_DIR)
+
+from lxml import html
+from utils.product.parser import get_structured_product_info
+from utils.websites import get_site_extractor
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+SITES_DIR = os.path.join(ROOT_DIR, 'sites')
+
+SITES = {
+    'ikea': 'https://www.ikea.com/se/sv/p/poang-fatolj-00000000/',
+    'elgiganten': 'https://www.elgiganten.se/product/tv/12345',
+    'trademax': 'https://www.trademax.se/soffor/bergen',
+    'chilli': 'https://www.chilli.se/bord/oslo',
+}
+
+def load_locators(site):
+    with open(os.path.join(SITES_DIR, f'{site}.json'), 'r', encoding='utf-8') as file:
+        definition = json.load(file)
+    return definition.get('selectorType', 'css'), tuple(definition['selectors'].values())
+
+def load_fixture(site):
+    with open(os.path.join(FIXTURES_DIR, f'{site}.html'), 'rb') as file:
+        return file.read()
+
+def parse_before(content, kind, locators):
+    # The extraction path used before the single-parse engine: a
+    # BeautifulSoup tree, re-serialised and re-parsed by lxml for XPaths.
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(content, 'html.parser')
+    if kind == 'css':
+        return [soup.select_one(locator) for locator in locators]
+    tree = html.fromstring(str(soup))
+    return [tree.xpath(locator) for locator in locators]
+
+def parse_after(url, content, site):
+    return site.extract(url, html.document_fromstring(content))
+
+def time_call(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+def main(repeat=20):
+    try:
+        import bs4
+    except ImportError:
+        bs4 = None
+        print("beautifulsoup4 is not installed; only the current parse path is measured.")
+
+    print(f"{'site':<12}{'size KB':>10}{'before ms':>12}{'after ms':>12}{'speedup':>10}{'head ms':>10}")
+    for site, url in SITES.items():
+        content = load_fixture(site)
+        extractor = get_site_extractor(url)
+        kind, locators = load_locators(site)
+        if parse_after(url, content, extractor) is None:
+            print(f"{site}: extraction failed on fixture")
+            continue
+        after = time_call(lambda: parse_after(url, content, extractor), repeat)
+        head = time_call(lambda: get_structured_product_info(url, content), repeat)
+        if bs4 is not None:
+            before = time_call(lambda: parse_before(content, kind, locators), repeat)
+            print(f"{site:<12}{len(content) / 1024:>10.1f}{before:>12.2f}{after:>12.2f}{before / after:>9.1f}x{head:>10.2f}")
+        else:
+            print(f"{site:<12}{len(content) / 1024:>10.1f}{'-':>12}{after:>12.2f}{'-':>10}{head:>10.2f}")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
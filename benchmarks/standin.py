@@ -0,0 +1,190 @@
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import threading
+import urllib.request
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# hostnames answered with the recorded page of each website
+SITE_HOSTS = {
+    'ikea.com': 'ikea',
+    'elgiganten.se': 'elgiganten',
+    'trademax.se': 'trademax',
+    'chilli.se': 'chilli',
+}
+
+# pages under /plain/ have no structured data in the head, so they take the CSS/XPath extraction paths
+PLAIN_PREFIX = '/plain/'
+
+STRUCTURED_DATA_PATTERN = re.compile(
+    rb'<script[^>]*application/ld\+json[^>]*>.*?</script>|<meta[^>]*property="(?:og|product):[^"]*"[^>]*>',
+    re.IGNORECASE | re.DOTALL
+)
+
+CONVERSION_RATES = {
+    'SEK': 1.0,
+    'GBP': 0.0741,
+    'USD': 0.0952,
+    'EUR': 0.0873,
+    'JPY': 14.21,
+    'NOK': 1.0189,
+    'DKK': 0.6512,
+}
+
+def load_fixtures():
+    fixtures = {}
+    for site in set(SITE_HOSTS.values()):
+        with open(os.path.join(FIXTURES_DIR, f'{site}.html'), 'rb') as file:
+            fixtures[site] = file.read()
+    return fixtures
+
+def strip_structured_data(body):
+    return STRUCTURED_DATA_PATTERN.sub(b'', body)
+
+def rate_table(base_currency):
+    base_rate = CONVERSION_RATES.get(base_currency)
+    if base_rate is None:
+        return None
+    return {currency: rate / base_rate for currency, rate in CONVERSION_RATES.items()}
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        # product URLs arrive through the proxy in absolute form, API calls directly
+        url = urlsplit(self.path)
+        host = (url.hostname or self.headers.get('Host', '')).split(':')[0]
+        if host.startswith('www.'):
+            host = host[4:]
+        if url.path == '/__requests':
+            stats = {'requests': self.server.requests, 'not_modified': self.server.not_modified}
+            self.send_body(200, json.dumps(stats).encode(), 'application/json')
+            return
+        self.server.count_request(host)
+
+        if url.path.startswith('/v6/'):
+            self.send_rate_table(url.path)
+        elif host in SITE_HOSTS:
+            fixtures = self.server.plain_fixtures if url.path.startswith(PLAIN_PREFIX) else self.server.fixtures
+            self.send_page(fixtures[SITE_HOSTS[host]])
+        else:
+            self.send_body(404, b'Not found', 'text/plain')
+
+    def send_rate_table(self, path):
+        # /v6/<api key>/latest/<base currency>
+        parts = path.strip('/').split('/')
+        conversion_rates = rate_table(parts[-1]) if len(parts) == 4 and parts[2] == 'latest' else None
+        if conversion_rates is None:
+            self.send_body(404, json.dumps({'result': 'error', 'error-type': 'unsupported-code'}).encode(), 'application/json')
+            return
+        payload = {'result': 'success', 'base_code': parts[-1], 'conversion_rates': conversion_rates}
+        self.send_body(200, json.dumps(payload).encode(), 'application/json')
+
+    def send_page(self, body):
+        etag = self.server.etags[id(body)]
+        if self.headers.get('If-None-Match') == etag:
+            self.server.count_not_modified()
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_body(200, body, 'text/html; charset=utf-8', {'ETag': etag})
+
+    def send_body(self, status, body, content_type, headers=None):
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # streaming downloads hang up as soon as the product has been found
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address=('127.0.0.1', 0)):
+        super().__init__(address, StandInHandler)
+        self.fixtures = load_fixtures()
+        self.plain_fixtures = {site: strip_structured_data(body) for site, body in self.fixtures.items()}
+        self.etags = {}
+        for fixtures in (self.fixtures, self.plain_fixtures):
+            self.etags.update({id(body): f'"{site}-{len(body)}"' for site, body in fixtures.items()})
+        self.requests = {}
+        self.not_modified = 0
+        self.lock = threading.Lock()
+
+    def count_request(self, host):
+        with self.lock:
+            self.requests[host] = self.requests.get(host, 0) + 1
+
+    def count_not_modified(self):
+        with self.lock:
+            self.not_modified += 1
+
+    def handle_error(self, request, client_address):
+        pass
+
+def serve(address, ready):
+    server = StandInServer(address)
+    ready.put(server.server_address[:2])
+    server.serve_forever()
+
+# runs the server in its own process, so it does not compete with the measured code for the GIL
+class StandInProcess:
+    def __init__(self, address=('127.0.0.1', 0)):
+        self.address = address
+        self.process = None
+        self.server_address = None
+
+    @property
+    def url(self):
+        host, port = self.server_address
+        return f'http://{host}:{port}'
+
+    def start(self):
+        ready = multiprocessing.Queue()
+        self.process = multiprocessing.Process(target=serve, args=(self.address, ready), daemon=True)
+        self.process.start()
+        self.server_address = tuple(ready.get(timeout=30))
+        return self
+
+    def stats(self):
+        opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+        with opener.open(f'{self.url}/__requests', timeout=10) as response:
+            return json.load(response)
+
+    def requests(self):
+        return self.stats()['requests']
+
+    def total_requests(self):
+        return sum(self.requests().values())
+
+    def not_modified(self):
+        return self.stats()['not_modified']
+
+    def stop(self):
+        self.process.terminate()
+        self.process.join()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the recorded product pages and exchange rates locally.")
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+    server = StandInServer(('127.0.0.1', args.port))
+    print(f"Serving the recorded pages on http://127.0.0.1:{args.port}, use it as the HTTP proxy for product URLs.")
+    server.serve_forever()
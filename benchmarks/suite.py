@@ -0,0 +1,352 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from parse_benchmark import SITES, load_fixture, parse_after, time_call
+from standin import PLAIN_PREFIX, StandInProcess, strip_structured_data
+
+# product URLs are plain http so the stand-in server can answer them as a proxy
+PRODUCT_URLS = {
+    'ikea': 'http://www.ikea.com/se/sv/p/product-{}/',
+    'elgiganten': 'http://www.elgiganten.se/product/{}',
+    'trademax': 'http://www.trademax.se/produkt/{}',
+    'chilli': 'http://www.chilli.se/produkt/{}',
+}
+
+# how the rescan reaches the product fields: from the structured data in the head, by parsing the whole
+# page in the parse pool with the CSS/XPath selectors, or by matching the selectors while the page streams in
+RESCAN_MODES = {
+    'head': {'plain': False, 'pipeline': True},
+    'full_page': {'plain': True, 'pipeline': True},
+    'streaming': {'plain': True, 'pipeline': False},
+}
+
+CATEGORIES = ('Kitchen', 'Living Room', 'Bedroom', 'Bathroom')
+TARGET_CURRENCIES = ('GBP', 'USD', 'JPY')
+
+FULL_SIZES = {
+    'rescan': (10, 100, 10000),
+    'save_product_info': (0, 1000, 10000, 100000),
+    'generate_html': (10, 100, 1000, 10000),
+}
+
+QUICK_SIZES = {
+    'rescan': (10, 100),
+    'save_product_info': (0, 1000),
+    'generate_html': (10, 100, 1000),
+}
+
+@contextlib.contextmanager
+def quiet():
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+        yield
+
+def write_config(server):
+    with open(os.path.join(ROOT_DIR, 'config.json'), 'r', encoding='utf-8') as file:
+        config = json.load(file)
+    # throttling is disabled so the numbers show the cost of the code, not of the pacing
+    config.update({
+        'enableAutoScan': False,
+        'sites': {'directory': os.path.join(ROOT_DIR, 'sites'), 'extractors': []},
+        'rescan': {'maxWorkers': 16, 'defaultDomainConcurrency': 4, 'domainConcurrency': {}},
+        'scheduler': {'requestsPerSecond': 1000000, 'burst': 1000, 'maxAttempts': 1},
+        'pageCache': {'enabled': False},
+        'storage': {
+            'path': './db/products.sqlite3',
+            'importJson': './db/data.json',
+            'priceHistory': './db/price_history.bin'
+        },
+        'export': {'priceDropReport': False, 'incremental': False},
+        'exchangeRates': {'cacheFile': './db/exchange_rates.json', 'ttlHours': 12},
+        'metrics': {'enabled': False}
+    })
+    with open('config.json', 'w', encoding='utf-8') as file:
+        json.dump(config, file, indent=2)
+
+    os.environ['EXCHANGE_RATE_API_KEY'] = 'benchmark'
+    os.environ['EXCHANGE_RATE_API_URL'] = f'{server.url}/v6'
+
+def configure(**sections):
+    from utils.config import load_config_section
+    with open('config.json', 'r', encoding='utf-8') as file:
+        config = json.load(file)
+    for section, settings in sections.items():
+        config[section] = dict(config.get(section, {}), **settings)
+    with open('config.json', 'w', encoding='utf-8') as file:
+        json.dump(config, file, indent=2)
+    load_config_section.cache_clear()
+
+def plain_url(url):
+    scheme, _, rest = url.partition('://')
+    host, _, path = rest.partition('/')
+    return f'{scheme}://{host}{PLAIN_PREFIX}{path}'
+
+def reset_store():
+    from utils.exchange_rate import _rate_tables
+    from utils.store import close_store
+    close_store()
+    _rate_tables.clear()
+    shutil.rmtree('./db', ignore_errors=True)
+
+def make_products(count, plain=False):
+    from utils.product.parser import get_structured_product_info
+    from utils.websites import get_site_extractor
+    from lxml import html
+
+    templates = []
+    for site, url in PRODUCT_URLS.items():
+        # the stored products match what the rescan will find, so no price is updated
+        url = plain_url(url) if plain else url
+        product_url = url.format(0)
+        content = strip_structured_data(load_fixture(site)) if plain else load_fixture(site)
+        product_info = get_structured_product_info(product_url, content)
+        if product_info is None:
+            product_info = get_site_extractor(product_url).extract(product_url, html.document_fromstring(content))
+        templates.append((url, product_info))
+
+    products = []
+    for index in range(count):
+        url, product_info = templates[index % len(templates)]
+        products.append(dict(product_info, url=url.format(index), name=f"{product_info['name']} {index // 2}"))
+    return products
+
+def fill_store(store, products):
+    for offset, category in enumerate(CATEGORIES):
+        chunk = products[offset::len(CATEGORIES)]
+        if chunk:
+            store.add_products(category, chunk)
+
+def timed_rescan():
+    from utils.helpers import perform_rescan
+    from utils.parser import determine_website_and_get_info
+
+    with quiet():
+        start = time.perf_counter()
+        perform_rescan(determine_website_and_get_info)
+        return time.perf_counter() - start
+
+def bench_rescan(server, sizes, mode):
+    from utils.store import get_store
+
+    settings = RESCAN_MODES[mode]
+    configure(pipeline={'enabled': settings['pipeline']}, streaming={'enabled': True}, pageCache={'enabled': False})
+    # the head mode keeps the plain names, so results of earlier runs can still be compared
+    label = 'rescan' if mode == 'head' else f'rescan[mode={mode}]'
+    results = {}
+    for count in sizes:
+        reset_store()
+        fill_store(get_store(), make_products(count, settings['plain']))
+        requests_before = server.total_requests()
+        elapsed = timed_rescan()
+        fetched = server.total_requests() - requests_before
+        if fetched != count:
+            print(f"{mode} rescan of {count} products made {fetched} requests")
+        key = f'rescan[products={count}]' if mode == 'head' else f'rescan[mode={mode},products={count}]'
+        results[f'{key}.seconds'] = elapsed
+        results[f'{key}.products_per_second'] = count / elapsed
+        print(f"{label:<24} {count:>6} products: {elapsed:8.2f}s {count / elapsed:10.1f} products/s")
+    return results
+
+def bench_rescan_cached(server, sizes):
+    from utils.store import get_store
+
+    configure(pipeline={'enabled': True}, streaming={'enabled': True}, pageCache={'enabled': True, 'directory': './db/page_cache'})
+    results = {}
+    for count in sizes:
+        reset_store()
+        fill_store(get_store(), make_products(count))
+        timed_rescan()
+        not_modified_before = server.not_modified()
+        elapsed = timed_rescan()
+        not_modified = server.not_modified() - not_modified_before
+        # every page was stored with its validators by the first pass
+        if not_modified != count:
+            print(f"cached rescan of {count} products got {not_modified} not modified responses")
+        results[f'rescan_cached[products={count}].seconds'] = elapsed
+        results[f'rescan_cached[products={count}].products_per_second'] = count / elapsed
+        print(f"{'rescan[page cache]':<24} {count:>6} products: {elapsed:8.2f}s {count / elapsed:10.1f} products/s")
+    configure(pageCache={'enabled': False})
+    return results
+
+def bench_parse(repeat):
+    from utils.product.parser import get_structured_product_info
+    from utils.websites import get_site_extractor
+
+    results = {}
+    for site, url in SITES.items():
+        content = load_fixture(site)
+        extractor = get_site_extractor(url)
+        full = time_call(lambda: parse_after(url, content, extractor), repeat)
+        head = time_call(lambda: get_structured_product_info(url, content), repeat)
+        results[f'parse[site={site}].full_page_ms'] = full
+        results[f'parse[site={site}].head_only_ms'] = head
+        print(f"parse {site:<12} full page {full:8.2f}ms  head only {head:8.2f}ms")
+    return results
+
+def bench_save_product_info(sizes, calls):
+    from utils.product.helpers import save_product_info
+    from utils.store import get_store
+
+    results = {}
+    for count in sizes:
+        reset_store()
+        products = make_products(count + calls)
+        fill_store(get_store(), products[:count])
+        timings = []
+        with quiet():
+            for product_info in products[count:]:
+                start = time.perf_counter()
+                save_product_info(product_info, CATEGORIES[0])
+                timings.append(time.perf_counter() - start)
+        median = statistics.median(timings) * 1000
+        results[f'save_product_info[store_size={count}].ms'] = median
+        print(f"save_product_info with {count:>6} stored products: {median:8.3f}ms per call")
+    return results
+
+def bench_exchange_rates(repeat):
+    from utils.exchange_rate import _rate_tables, get_conversion_rates
+
+    cold = []
+    for _ in range(repeat):
+        reset_store()
+        start = time.perf_counter()
+        rates = get_conversion_rates('SEK', TARGET_CURRENCIES)
+        cold.append(time.perf_counter() - start)
+    if sorted(rates) != sorted(TARGET_CURRENCIES):
+        print("exchange rate stand-in returned incomplete rates")
+    warm = time_call(lambda: get_conversion_rates('SEK', TARGET_CURRENCIES), repeat)
+    cold_ms = statistics.median(cold) * 1000
+    results = {'exchange_rates.fetch_ms': cold_ms, 'exchange_rates.cached_ms': warm}
+    print(f"exchange rates fetch {cold_ms:8.2f}ms  cached {warm:8.4f}ms")
+    _rate_tables.clear()
+    return results
+
+def bench_generate_html(sizes, repeat):
+    from utils.exchange_rate import get_conversion_rates
+    from utils.generator.helpers import calculate_totals, parse_prices
+    from utils.generator.html import generate_html
+
+    reset_store()
+    rates = get_conversion_rates('SEK', TARGET_CURRENCIES)
+    results = {}
+    for count in sizes:
+        data = {}
+        for index, product_info in enumerate(make_products(count)):
+            data.setdefault(CATEGORIES[index % len(CATEGORIES)], {})[str(index)] = product_info
+
+        def render():
+            prices = parse_prices(data)
+            totals = calculate_totals(prices, rates)
+            return ''.join(generate_html(data, totals, 'SEK', True, list(TARGET_CURRENCIES), rates, prices=prices))
+
+        render()
+        elapsed = time_call(render, max(3, repeat // max(1, count // 100)))
+        results[f'generate_html[items={count}].ms'] = elapsed
+        print(f"generate_html {count:>6} items: {elapsed:10.2f}ms")
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def higher_is_better(key):
+    return key.endswith('_per_second')
+
+def compare(results, baseline, threshold):
+    regressions = []
+    print(f"\n{'benchmark':<52}{'baseline':>12}{'current':>12}{'change':>9}")
+    for key, value in results.items():
+        previous = baseline.get(key)
+        if not previous:
+            continue
+        change = (value - previous) / previous
+        slower = -change if higher_is_better(key) else change
+        flag = '  REGRESSION' if slower > threshold else ''
+        print(f"{key:<52}{previous:>12.3f}{value:>12.3f}{change * 100:>+8.1f}%{flag}")
+        if flag:
+            regressions.append(key)
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks against a local stand-in for the supported websites and the ExchangeRate-API.")
+    parser.add_argument('--quick', action='store_true', help="Use smaller sizes, for a quick check.")
+    parser.add_argument('--repeat', type=int, default=20, help="Repetitions per timing; the median is reported.")
+    parser.add_argument('--output', help="Save the results to this JSON file.")
+    parser.add_argument('--compare', help="Compare against the results saved by an earlier run.")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Relative slowdown reported as a regression.")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)['results']
+    output = os.path.abspath(args.output) if args.output else None
+    sizes = QUICK_SIZES if args.quick else FULL_SIZES
+
+    server = StandInProcess().start()
+    work_dir = tempfile.mkdtemp(prefix='scraper-benchmark-')
+    previous_dir = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        write_config(server)
+        from utils.session import close_session, get_session
+        from utils.store import close_store
+        get_session().proxies.update({'http': server.url})
+
+        results = {}
+        results.update(bench_parse(args.repeat))
+        results.update(bench_exchange_rates(args.repeat))
+        results.update(bench_generate_html(sizes['generate_html'], args.repeat))
+        results.update(bench_save_product_info(sizes['save_product_info'], args.repeat * 10))
+        for mode in RESCAN_MODES:
+            results.update(bench_rescan(server, sizes['rescan'], mode))
+        results.update(bench_rescan_cached(server, sizes['rescan']))
+        close_store()
+        close_session()
+    finally:
+        os.chdir(previous_dir)
+        shutil.rmtree(work_dir, ignore_errors=True)
+        server.stop()
+
+    report = {
+        'commit': git_commit(),
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'quick': args.quick,
+        'repeat': args.repeat,
+        'results': results
+    }
+    if output:
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+        print(f"\nResults saved to {output}.")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} benchmarks are more than {args.threshold:.0%} slower than the baseline.")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,13 @@
-import json
+import sys
 from dotenv import load_dotenv
+from utils.cli import run_cli
 from utils.parser import determine_website_and_get_info
-from utils.generator.html import generate_html
-from utils.helpers import load_data, load_config, perform_rescan
+from utils.generator.report import export_report
+from utils.helpers import load_config, perform_rescan
+from utils.metrics import load_metrics, write_metrics
 from utils.product.helpers import save_product_info
-from utils.generator.helpers import save_html, calculate_totals
+from utils.session import close_session
+from utils.store import close_store
 
 load_dotenv()
 
@@ -13,6 +16,14 @@ def main():
     if categories is None:
         return
 
+    load_metrics()
+    if len(sys.argv) > 1:
+        exit_code = run_cli(sys.argv[1:], categories, base_currency, target_currencies, enable_conversion)
+        write_metrics(sys.argv[1])
+        close_session()
+        close_store()
+        sys.exit(exit_code)
+
     if enable_auto_scan:
         perform_rescan(determine_website_and_get_info)
 
@@ -68,14 +79,7 @@ def main():
                     else:
                         print("Failed to retrieve product information. Please try again.")
         elif action == 'export':
-            data = load_data('./db/data.json')
-            if not data:
-                print("No data to export.")
-                continue
-            totals = calculate_totals(data)
-            html_content = generate_html(data, totals, base_currency, enable_conversion, target_currencies)
-            save_html(html_content, 'product_list.html')
-            print("HTML report generated successfully.")
+            export_report(base_currency, enable_conversion, target_currencies)
         elif action == 'rescan':
             perform_rescan(determine_website_and_get_info)
         elif action == 'exit':
@@ -83,5 +87,9 @@ def main():
         else:
             print("Invalid action. Please choose 'export', 'add', 'rescan', or 'exit'.")
 
+    write_metrics('interactive')
+    close_session()
+    close_store()
+
 if __name__ == "__main__":
     main()
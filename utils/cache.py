@@ -0,0 +1,104 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+class PageCache:
+    def __init__(self, directory='./db/page_cache', max_entries=100000):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.index_file = os.path.join(directory, 'index.json')
+        # only the validators are kept, a page the website reports as unchanged is never read again
+        self.entries = OrderedDict()
+        # validators of fetched pages wait here until the page was parsed into a product
+        self.pending = {}
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+        self._load_index()
+
+    def _load_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as file:
+                entries = json.load(file)
+        except FileNotFoundError:
+            return
+        except json.JSONDecodeError:
+            print(f"Error decoding page cache index: {self.index_file}")
+            return
+
+        for url, entry in sorted(entries.items(), key=lambda item: item[1].get('last_access', 0)):
+            self.entries[url] = entry
+
+    def conditional_headers(self, url):
+        with self._lock:
+            entry = self.entries.get(url)
+            if not entry:
+                return {}
+            headers = {}
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+            return headers
+
+    def record_hit(self, url):
+        with self._lock:
+            entry = self.entries.get(url)
+            self.hits += 1
+            if entry:
+                entry['last_access'] = time.time()
+                self.entries.move_to_end(url)
+                self.bytes_saved += entry['size']
+
+    def store(self, url, headers, size):
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        with self._lock:
+            self.misses += 1
+            self.entries.pop(url, None)
+            self.pending.pop(url, None)
+            if not etag and not last_modified:
+                return
+            self.pending[url] = {
+                'etag': etag,
+                'last_modified': last_modified,
+                'size': size
+            }
+
+    def confirm(self, url):
+        with self._lock:
+            entry = self.pending.pop(url, None)
+            if entry is None:
+                return
+            entry['last_access'] = time.time()
+            self.entries[url] = entry
+            self._evict()
+
+    def discard(self, url):
+        with self._lock:
+            self.entries.pop(url, None)
+            self.pending.pop(url, None)
+
+    def _evict(self):
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def save(self):
+        with self._lock:
+            try:
+                with open(self.index_file, 'w', encoding='utf-8') as file:
+                    json.dump(self.entries, file)
+            except IOError as e:
+                print(f"Error saving page cache index: {e}")
+
+def load_page_cache(cache_config):
+    if not cache_config.get('enabled', False):
+        return None
+    return PageCache(
+        cache_config.get('directory', './db/page_cache'),
+        cache_config.get('maxEntries', 100000)
+    )
@@ -0,0 +1,110 @@
+import argparse
+import sys
+import time
+from collections import Counter
+from functools import partial
+from tqdm import tqdm
+from utils.config import load_config_section
+from utils.distributed import run_worker
+from utils.generator.report import export_report
+from utils.helpers import perform_rescan
+from utils.parser import scrape_product, determine_website_and_get_info
+from utils.rescan import scan_concurrently
+from utils.scheduler import CircuitOpenError, FetchError, load_scheduler
+from utils.store import get_store
+
+def read_urls(file_path):
+    if file_path == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(file_path, 'r', encoding='utf-8') as file:
+            lines = file.read().splitlines()
+    return [line.strip() for line in lines if line.strip() and not line.strip().startswith('#')]
+
+def print_summary(action, total, succeeded, failures, elapsed):
+    rate = total / elapsed if elapsed > 0 else 0
+    print(f"{action} {total} URLs in {elapsed:.1f}s ({rate:.1f} URLs/s): {succeeded} succeeded, {sum(failures.values())} failed.")
+    for reason, count in failures.most_common():
+        print(f"  {reason}: {count}")
+
+def bulk_add(urls, category):
+    rescan_config = load_config_section('rescan')
+    start = time.perf_counter()
+    products = [None] * len(urls)
+    failures = Counter()
+
+    results = scan_concurrently(
+        list(enumerate(urls)),
+        partial(scrape_product, retries=1, raise_errors=True),
+        rescan_config.get('maxWorkers', 8),
+        rescan_config.get('domainConcurrency', {}),
+        rescan_config.get('defaultDomainConcurrency', 2),
+        load_scheduler()
+    )
+    for index, result, error in tqdm(results, total=len(urls), desc="Adding items", unit="url"):
+        if isinstance(error, FetchError):
+            failures['fetch failed'] += 1
+            continue
+        if isinstance(error, CircuitOpenError):
+            failures['skipped, website failing'] += 1
+            continue
+        if error:
+            failures[f"error: {type(error).__name__}"] += 1
+            continue
+        product_info, reason = result
+        if product_info:
+            products[index] = product_info
+        else:
+            failures[reason] += 1
+
+    products = [product_info for product_info in products if product_info]
+    if products:
+        get_store().add_products(category, products)
+        print(f"Saved {len(products)} products to {category} category in the product store")
+
+    print_summary("Added", len(urls), len(products), failures, time.perf_counter() - start)
+    return not failures
+
+def build_parser(categories):
+    parser = argparse.ArgumentParser(prog='main.py', description="Scrape, rescan and export product information.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    add_parser = subparsers.add_parser('add', help="Add products from a list of URLs.")
+    add_parser.add_argument('--category', required=True, choices=categories, help="Category to add the products to.")
+    add_parser.add_argument('--urls-file', required=True, help="File with one product URL per line, or - for stdin.")
+
+    rescan_parser = subparsers.add_parser('rescan', help="Rescan the prices of all stored products.")
+    rescan_parser.add_argument('--max-age-hours', type=float, help="Skip products rescanned within this many hours; 0 rescans everything.")
+
+    worker_parser = subparsers.add_parser('worker', help="Rescan shards from the work queue of a distributed rescan.")
+    worker_parser.add_argument('--queue', help="Path of the work queue, shared with the coordinator.")
+
+    export_parser = subparsers.add_parser('export', help="Export the stored products to an HTML report.")
+    export_parser.add_argument('--output', default='product_list.html', help="Path of the HTML report.")
+    return parser
+
+def run_cli(argv, categories, base_currency, target_currencies, enable_conversion):
+    args = build_parser(categories).parse_args(argv)
+
+    if args.command == 'add':
+        try:
+            urls = read_urls(args.urls_file)
+        except IOError as e:
+            print(f"Error reading URLs file: {e}")
+            return 1
+        if not urls:
+            print("No URLs to add.")
+            return 1
+        return 0 if bulk_add(urls, args.category) else 1
+    elif args.command == 'rescan':
+        start = time.perf_counter()
+        perform_rescan(determine_website_and_get_info, args.max_age_hours)
+        print(f"Rescan finished in {time.perf_counter() - start:.1f}s.")
+        return 0
+    elif args.command == 'worker':
+        start = time.perf_counter()
+        processed = run_worker(args.queue)
+        print(f"Worker rescanned {processed} items in {time.perf_counter() - start:.1f}s.")
+        return 0
+    elif args.command == 'export':
+        return 0 if export_report(base_currency, enable_conversion, target_currencies, args.output) else 1
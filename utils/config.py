@@ -0,0 +1,10 @@
+import json
+from functools import lru_cache
+
+@lru_cache(maxsize=None)
+def load_config_section(section):
+    try:
+        with open('config.json', 'r', encoding='utf-8') as config_file:
+            return json.load(config_file).get(section, {})
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
@@ -0,0 +1,301 @@
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import time
+import zlib
+from functools import partial
+from itertools import zip_longest
+from utils.config import load_config_section
+from utils.constants import NOT_MODIFIED
+from utils.product.helpers import get_domain
+from utils.rescan import scan_concurrently
+from utils.scheduler import CircuitBreaker, DomainScheduler, load_scheduler
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shards (
+    id INTEGER PRIMARY KEY,
+    domain TEXT NOT NULL,
+    tasks TEXT NOT NULL,
+    worker TEXT,
+    leased_until REAL,
+    done INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    category TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    product_info TEXT,
+    not_modified INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS rate_limits (
+    domain TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    paused_until REAL NOT NULL DEFAULT 0
+);
+"""
+
+def make_shards(tasks, shard_size=50):
+    # the same URL always lands in the same shard of its domain
+    domains = {}
+    for key, url in tasks:
+        domains.setdefault(get_domain(url), []).append((key, url))
+    domain_shards = []
+    for domain, domain_tasks in sorted(domains.items()):
+        count = max(1, -(-len(domain_tasks) // max(1, shard_size)))
+        buckets = [[] for _ in range(count)]
+        for key, url in domain_tasks:
+            buckets[zlib.crc32(url.encode('utf-8')) % count].append((key, url))
+        domain_shards.append([(domain, bucket) for bucket in buckets if bucket])
+    # interleaved, so workers taking shards in order are spread over the websites
+    return [shard for shards in zip_longest(*domain_shards) for shard in shards if shard is not None]
+
+class WorkQueue:
+    def __init__(self, path='./db/work_queue.sqlite3'):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so concurrent workers queue up instead of failing
+        self.connection.execute('BEGIN IMMEDIATE')
+        return self.connection
+
+    def _run(self, operation, *args):
+        connection = self._transaction()
+        try:
+            result = operation(connection, *args)
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return result
+
+    def enqueue(self, shards):
+        def operation(connection):
+            connection.execute('DELETE FROM shards')
+            connection.execute('DELETE FROM results')
+            connection.executemany(
+                'INSERT INTO shards (domain, tasks) VALUES (?, ?)',
+                ((domain, json.dumps([[category, item_id, url] for (category, item_id), url in tasks])) for domain, tasks in shards)
+            )
+        self._run(operation)
+
+    def lease(self, worker, lease_seconds):
+        def operation(connection):
+            now = time.time()
+            row = connection.execute(
+                'SELECT id, tasks FROM shards WHERE done = 0 AND (leased_until IS NULL OR leased_until < ?) ORDER BY id LIMIT 1',
+                (now,)
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute('UPDATE shards SET worker = ?, leased_until = ? WHERE id = ?', (worker, now + lease_seconds, row['id']))
+            return row['id'], [((category, item_id), url) for category, item_id, url in json.loads(row['tasks'])]
+        return self._run(operation)
+
+    def renew(self, shard_id, worker, lease_seconds):
+        self._run(lambda connection: connection.execute(
+            'UPDATE shards SET leased_until = ? WHERE id = ? AND worker = ? AND done = 0',
+            (time.time() + lease_seconds, shard_id, worker)
+        ))
+
+    def complete(self, shard_id, worker, results):
+        def operation(connection):
+            # a shard that was handed to another worker after its lease ran out is reported by that worker
+            if connection.execute('SELECT 1 FROM shards WHERE id = ? AND worker = ? AND done = 0', (shard_id, worker)).fetchone() is None:
+                return False
+            connection.executemany(
+                'INSERT INTO results (category, item_id, product_info, not_modified, error) VALUES (?, ?, ?, ?, ?)',
+                results
+            )
+            connection.execute('UPDATE shards SET done = 1 WHERE id = ?', (shard_id,))
+            return True
+        return self._run(operation)
+
+    def take_results(self, limit=500):
+        def operation(connection):
+            rows = connection.execute('SELECT * FROM results ORDER BY id LIMIT ?', (limit,)).fetchall()
+            if rows:
+                connection.execute('DELETE FROM results WHERE id <= ?', (rows[-1]['id'],))
+            return rows
+        return self._run(operation)
+
+    def remaining(self):
+        return self.connection.execute('SELECT COUNT(*) FROM shards WHERE done = 0').fetchone()[0]
+
+    def acquire_slot(self, domain, rate, capacity):
+        # a token bucket per domain shared by every worker, returns the seconds to wait or 0 once a token was taken
+        def operation(connection):
+            now = time.time()
+            row = connection.execute('SELECT tokens, updated_at, paused_until FROM rate_limits WHERE domain = ?', (domain,)).fetchone()
+            tokens, paused_until = capacity, 0.0
+            if row is not None:
+                tokens = min(capacity, row['tokens'] + max(0.0, now - row['updated_at']) * rate)
+                paused_until = row['paused_until']
+            if paused_until > now:
+                return paused_until - now
+            if tokens < 1:
+                return (1 - tokens) / rate
+            connection.execute(
+                'INSERT OR REPLACE INTO rate_limits (domain, tokens, updated_at, paused_until) VALUES (?, ?, ?, ?)',
+                (domain, tokens - 1, now, paused_until)
+            )
+            return 0.0
+        return self._run(operation)
+
+    def pause(self, domain, seconds):
+        def operation(connection):
+            paused_until = time.time() + seconds
+            updated = connection.execute(
+                'UPDATE rate_limits SET paused_until = MAX(paused_until, ?) WHERE domain = ?', (paused_until, domain)
+            ).rowcount
+            if not updated:
+                connection.execute(
+                    'INSERT INTO rate_limits (domain, tokens, updated_at, paused_until) VALUES (?, 0, ?, ?)',
+                    (domain, time.time(), paused_until)
+                )
+        self._run(operation)
+
+class SharedDomainScheduler(DomainScheduler):
+    def __init__(self, work_queue, **options):
+        super().__init__(**options)
+        self.work_queue = work_queue
+        self.shared_ready_at = {}
+
+    def ready_at(self, domain):
+        return max(super().ready_at(domain), self.shared_ready_at.get(domain, 0.0))
+
+    def acquire(self, domain):
+        with self.lock:
+            now = time.monotonic()
+            bucket = self._bucket(domain)
+            breaker = self._breaker(domain)
+            if bucket.ready_at(now) > now or self.shared_ready_at.get(domain, 0.0) > now:
+                return False
+            trial = breaker.state != CircuitBreaker.CLOSED
+            if not breaker.allow(now):
+                return False
+            # the local bucket only carries the adaptive rate and Retry-After pauses, the pacing itself is shared
+            wait = self.work_queue.acquire_slot(domain, bucket.rate, bucket.capacity)
+            if wait > 0:
+                self.shared_ready_at[domain] = now + wait
+                if trial:
+                    breaker.trial_in_flight = False
+                return False
+            return True
+
+    def record_failure(self, domain, error, attempt):
+        if error.throttled and error.retry_after is not None:
+            self.work_queue.pause(domain, min(error.retry_after, self.backoff_max))
+        return super().record_failure(domain, error, attempt)
+
+def run_worker(queue_path=None, worker=None):
+    from utils.parser import determine_website_and_get_info
+
+    distributed_config = load_config_section('distributed')
+    rescan_config = load_config_section('rescan')
+    queue_path = queue_path or distributed_config.get('queuePath', './db/work_queue.sqlite3')
+    lease_seconds = distributed_config.get('leaseSeconds', 300)
+    worker = worker or f"{socket.gethostname()}-{os.getpid()}"
+    work_queue = WorkQueue(queue_path)
+    scheduler = load_scheduler(SharedDomainScheduler, work_queue=work_queue)
+    scan = partial(determine_website_and_get_info, retries=1, raise_errors=True)
+    processed = 0
+    try:
+        while True:
+            lease = work_queue.lease(worker, lease_seconds)
+            if lease is None:
+                if not work_queue.remaining():
+                    break
+                # the other shards are leased, one of them may come back if its worker stops
+                time.sleep(1)
+                continue
+
+            shard_id, tasks = lease
+            results = []
+            renewed_at = time.monotonic()
+            for (category, item_id), product_info, error in scan_concurrently(
+                tasks,
+                scan,
+                rescan_config.get('maxWorkers', 8),
+                rescan_config.get('domainConcurrency', {}),
+                rescan_config.get('defaultDomainConcurrency', 2),
+                scheduler
+            ):
+                not_modified = product_info is NOT_MODIFIED
+                results.append((
+                    category,
+                    item_id,
+                    None if not_modified or not product_info else json.dumps(product_info),
+                    int(not_modified),
+                    str(error) if error else None
+                ))
+                if time.monotonic() - renewed_at > lease_seconds / 3:
+                    work_queue.renew(shard_id, worker, lease_seconds)
+                    renewed_at = time.monotonic()
+            if work_queue.complete(shard_id, worker, results):
+                processed += len(results)
+    finally:
+        work_queue.close()
+    return processed
+
+def run_local_worker(work_dir, queue_path):
+    # spawned processes start in the directory multiprocessing was first imported from
+    os.chdir(work_dir)
+    return run_worker(queue_path)
+
+def rescan_distributed(tasks, distributed_config=None):
+    distributed_config = distributed_config or {}
+    queue_path = distributed_config.get('queuePath', './db/work_queue.sqlite3')
+    local_workers = distributed_config.get('localWorkers', os.cpu_count() or 1)
+    work_queue = WorkQueue(queue_path)
+    shards = make_shards(tasks, distributed_config.get('shardSize', 50))
+    work_queue.enqueue(shards)
+    print(f"Queued {len(tasks)} items in {len(shards)} shards at {queue_path}.")
+
+    # workers are started fresh rather than forked, so they do not share sockets or the store connection
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=run_local_worker, args=(os.getcwd(), queue_path), daemon=True) for _ in range(max(0, local_workers))]
+    for process in workers:
+        process.start()
+    if not workers:
+        print(f"Waiting for workers, start them with: python main.py worker --queue {queue_path}")
+
+    try:
+        while True:
+            # shards are counted before taking results, so results of the last shard are never left behind
+            remaining = work_queue.remaining()
+            rows = work_queue.take_results()
+            for row in rows:
+                if row['not_modified']:
+                    product_info = NOT_MODIFIED
+                else:
+                    product_info = json.loads(row['product_info']) if row['product_info'] else None
+                yield (row['category'], row['item_id']), product_info, row['error']
+            if rows:
+                continue
+            if not remaining:
+                break
+            if workers and not any(process.is_alive() for process in workers):
+                print(f"\nAll workers stopped with {remaining} shards left.")
+                break
+            time.sleep(0.2)
+    finally:
+        for process in workers:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        work_queue.close()
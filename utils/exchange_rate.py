@@ -1,20 +1,90 @@
+import json
 import os
+import threading
+import time
 import requests
-from utils.constants import HEADERS
+from utils.config import load_config_section
+from utils.session import get_session
 
-def get_exchange_rate(base_currency, target_currency):
+EXCHANGE_RATE_API_URL = 'https://v6.exchangerate-api.com/v6'
+
+_rate_tables = {}
+_rate_tables_lock = threading.Lock()
+
+def fetch_rate_table(base_currency):
     api_key = os.getenv('EXCHANGE_RATE_API_KEY')
-    url = f"https://v6.exchangerate-api.com/v6/{api_key}/latest/{base_currency}"
+    api_url = os.getenv('EXCHANGE_RATE_API_URL', EXCHANGE_RATE_API_URL).rstrip('/')
+    url = f"{api_url}/{api_key}/latest/{base_currency}"
     try:
-        response = requests.get(url, headers=HEADERS, timeout=10)
+        response = get_session().get(url, timeout=10)
         response.raise_for_status()
-    except requests.RequestException as e:
+        data = response.json()
+    except (requests.RequestException, ValueError) as e:
         print(f"Failed to retrieve exchange rate: {e}")
         return None
-    
-    data = response.json()
-    if 'conversion_rates' not in data or target_currency not in data['conversion_rates']:
+
+    if 'conversion_rates' not in data:
         print("Invalid exchange rate data")
         return None
-    
-    return data['conversion_rates'][target_currency]
+
+    return data['conversion_rates']
+
+def load_rate_cache(cache_file):
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+    except json.JSONDecodeError:
+        print(f"Error decoding exchange rate cache: {cache_file}")
+        return {}
+
+def save_rate_cache(cache_file, rate_tables):
+    directory = os.path.dirname(cache_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_file = f"{cache_file}.tmp"
+    try:
+        with open(temp_file, 'w', encoding='utf-8') as file:
+            json.dump(rate_tables, file)
+        os.replace(temp_file, cache_file)
+    except IOError as e:
+        print(f"Error saving exchange rate cache: {e}")
+
+def get_rate_table(base_currency):
+    rates_config = load_config_section('exchangeRates')
+    cache_file = rates_config.get('cacheFile', './db/exchange_rates.json')
+    ttl = rates_config.get('ttlHours', 12) * 3600
+
+    with _rate_tables_lock:
+        if not _rate_tables:
+            _rate_tables.update(load_rate_cache(cache_file))
+
+        cached = _rate_tables.get(base_currency)
+        if cached and time.time() - cached['fetched_at'] < ttl:
+            return cached['conversion_rates']
+
+        conversion_rates = fetch_rate_table(base_currency)
+        if conversion_rates is not None:
+            _rate_tables[base_currency] = {'fetched_at': time.time(), 'conversion_rates': conversion_rates}
+            save_rate_cache(cache_file, _rate_tables)
+            return conversion_rates
+
+        if cached:
+            fetched_at = time.strftime("%d-%m-%Y %H:%M:%S", time.localtime(cached['fetched_at']))
+            print(f"Using cached {base_currency} exchange rates from {fetched_at}.")
+            return cached['conversion_rates']
+        return None
+
+def get_conversion_rates(base_currency, target_currencies):
+    conversion_rates = get_rate_table(base_currency) or {}
+    rates = {}
+    for target_currency in target_currencies:
+        if target_currency not in conversion_rates:
+            print(f"Failed to retrieve exchange rate for {target_currency}.")
+            continue
+        rates[target_currency] = conversion_rates[target_currency]
+    return rates
+
+def convert_price(price, rates):
+    return {currency: price * rate for currency, rate in rates.items()}
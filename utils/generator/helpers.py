@@ -1,36 +1,65 @@
-from utils.exchange_rate import get_exchange_rate
+import math
+import operator
+from array import array
+from utils.exchange_rate import convert_price
 
-def calculate_totals(data):
-    totals = {}
-    overall_original_total = 0
+def item_price(item):
+    return float(item['price'].split()[0])
 
-    for category, items in data.items():
-        original_total = 0
+def parse_prices(data):
+    # one array per category in the order of its items, shared by the totals and the grouping
+    return {category: array('d', map(item_price, items.values())) for category, items in data.items()}
+
+def calculate_totals(prices, rates=None):
+    totals = {}
 
-        for item in items.values():
-            price = float(item['price'].split()[0])
-            original_total += price
+    for category, category_prices in prices.items():
+        totals[category] = {'original_total': math.fsum(category_prices)}
 
-        totals[category] = {'original_total': original_total}
-        overall_original_total += original_total
+    totals['overall'] = {'original_total': math.fsum(total['original_total'] for total in totals.values())}
 
-    totals['overall'] = {'original_total': overall_original_total}
+    if rates:
+        for total in totals.values():
+            total['exchange_totals'] = convert_price(total['original_total'], rates)
     return totals
 
-def get_exchange_prices(price, base_currency, target_currencies, enable_conversion):
+def group_items(data, prices, rates=None):
+    grouped_items = {}
+    all_groups = []
+    unit_prices = array('d')
+    for category, items in data.items():
+        groups = {}
+        for item, price in zip(items.values(), prices[category]):
+            group = groups.get(item['name'])
+            if group is None:
+                group = groups[item['name']] = {'name': item['name'], 'item': item, 'quantity': 0}
+                unit_prices.append(price)
+            group['quantity'] += 1
+        grouped_items[category] = list(groups.values())
+        all_groups.extend(grouped_items[category])
+
+    quantities = array('d', (group['quantity'] for group in all_groups))
+    line_totals = array('d', map(operator.mul, unit_prices, quantities))
     exchange_prices = {}
-    if enable_conversion:
-        for target_currency in target_currencies:
-            exchange_rate = get_exchange_rate(base_currency, target_currency)
-            if exchange_rate is None:
-                print(f"Failed to retrieve exchange rate for {target_currency}.")
-                continue
-            exchange_prices[target_currency] = price * exchange_rate
-    return exchange_prices
-    
+    exchange_totals = {}
+    for currency, rate in (rates or {}).items():
+        exchange_prices[currency] = array('d', map(float(rate).__mul__, unit_prices))
+        exchange_totals[currency] = array('d', map(float(rate).__mul__, line_totals))
+
+    for index, group in enumerate(all_groups):
+        group['price'] = unit_prices[index]
+        group['total'] = line_totals[index]
+        group['exchange_prices'] = {currency: prices[index] for currency, prices in exchange_prices.items()}
+        group['exchange_totals'] = {currency: totals[index] for currency, totals in exchange_totals.items()}
+    return grouped_items
+
 def save_html(html_content, file_path):
     try:
         with open(file_path, 'w', encoding='utf-8') as file:
-            file.write(html_content)
+            if isinstance(html_content, str):
+                file.write(html_content)
+            else:
+                for chunk in html_content:
+                    file.write(chunk)
     except IOError as e:
         print(f"Error saving HTML to file: {file_path}. {e}")
\ No newline at end of file
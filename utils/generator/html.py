@@ -1,119 +1,92 @@
-from jinja2 import Template
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
+from functools import lru_cache
 import datetime
-from utils.generator.helpers import get_exchange_prices
+import os
+from utils.exchange_rate import convert_price
+from utils.generator.helpers import group_items, parse_prices
 
-def generate_html(data, totals, base_currency, enable_conversion, target_currencies):
-    timestamp = datetime.datetime.now().strftime("%d-%m-%Y %H:%M:%S")
-    
-    exchange_rate_cache = {}
-
-    def get_cached_exchange_prices(price, base_currency, target_currencies, enable_conversion):
-        if not enable_conversion:
-            return {}
-        cache_key = f"{price}_{base_currency}_{target_currencies}"
-        if cache_key not in exchange_rate_cache:
-            exchange_rate_cache[cache_key] = get_exchange_prices(price, base_currency, target_currencies, enable_conversion)
-        return exchange_rate_cache[cache_key]
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
 
-    html_template = """
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1">
-        <title>Product List</title>
-        <style>
-            body { font-family: Arial, sans-serif; display: flex; justify-content: center; padding: 20px; background-color: #f5f5f5; }
-            .container { max-width: 800px; width: 100%; background: #fff; padding: 20px; border-radius: 10px; box-shadow: 0 0 10px rgba(0,0,0,0.1); }
-            .timestamp { text-align: center; margin-bottom: 20px; color: #777; }
-            .overall-total { font-weight: bold; margin-bottom: 20px; color: #333; display: flex; justify-content: space-between; }
-            .category { margin-top: 20px; }
-            .category h2 { margin-bottom: 5px; color: #333; }
-            .category-total { font-weight: bold; margin-bottom: 10px; color: #555; }
-            .items { display: flex; flex-wrap: wrap; }
-            .item { flex: 1 1 45%; margin: 10px; padding: 10px; border-radius: 5px; box-shadow: 0 0 5px rgba(0,0,0,0.05); background: #f0f0f0; word-wrap: break-word; }
-            .item:nth-of-type(odd) { background: #fafafa; }
-            .item img { width: 100px; height: 100px; margin-right: 15px; border-radius: 5px; object-fit: cover; }
-            .item-details div { margin-bottom: 5px; }
-            .item-count { font-weight: bold; color: #333; }
+@lru_cache(maxsize=None)
+def get_environment():
+    return Environment(
+        loader=FileSystemLoader(TEMPLATES_DIR),
+        bytecode_cache=FileSystemBytecodeCache(),
+        auto_reload=False
+    )
 
-            @media (max-width: 600px) {
-                .item { flex: 1 1 100%; }
-                .item img { width: 100%; height: auto; margin-bottom: 10px; }
-                .item-details { width: 100%; }
-            }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="timestamp">
-                Report generated on: {{ timestamp }}
-            </div>
-            <div class="overall-total">
-                <div>Total {{ base_currency }}: {{ "%.2f" % totals['overall']['original_total'] }}</div>
-                {% set overall_exchange_totals = get_cached_exchange_prices(totals['overall']['original_total'], base_currency, target_currencies, enable_conversion) %}
-                {% for currency, total in overall_exchange_totals.items() %}
-                    <div>Total {{ currency }}: {{ "%.2f" % total }}</div>
-                {% endfor %}
-            </div>
-            {% for category, items in data.items() %}
-            {% if items %}
-            <div class="category">
-                <h2>{{ category }}</h2>
-                <div class="category-total">Total {{ base_currency }}: {{ "%.2f" % totals[category]['original_total'] }}
-                {% set category_exchange_totals = get_cached_exchange_prices(totals[category]['original_total'], base_currency, target_currencies, enable_conversion) %}
-                {% for currency, total in category_exchange_totals.items() %}
-                    | Total {{ currency }}: {{ "%.2f" % total }}
-                {% endfor %}
-                </div>
-                <div class="items">
-                    {% set grouped_items = {} %}
-                    {% for item in items.values() %}
-                        {% if item.name in grouped_items %}
-                            {% set grouped_items = grouped_items.update({item.name: grouped_items[item.name] + [item]}) %}
-                        {% else %}
-                            {% set grouped_items = grouped_items.update({item.name: [item]}) %}
-                        {% endif %}
-                    {% endfor %}
-                    {% for item_name, item_list in grouped_items.items() %}
-                    {% set item_count = item_list | count %}
-                    {% set first_item = item_list[0] %}
-                    <div class="item">
-                        <img src="{{ first_item.picture_url }}" alt="{{ item_name }}" loading="lazy">
-                        <div class="item-details">
-                            <div><strong>{{ item_name }}</strong></div>
-                            <div>{{ base_currency }} Price: {{ first_item.price }}</div>
-                            <div class="item-count">Quantity: {{ item_count }}</div>
-                            {% if item_count > 1 %}
-                            <div class="item-total-price">{{ base_currency }} Total Price: {{ "%.2f" % (first_item.price.split()[0]|float * item_count) }}</div>
-                            {% endif %}
-                            {% set exchange_prices = get_cached_exchange_prices(first_item.price.split()[0]|float, base_currency, target_currencies, enable_conversion) %}
-                            {% for currency, price in exchange_prices.items() %}
-                                <div>{{ currency }} Price: {{ "%.2f" % price }}</div>
-                                {% if item_count > 1 %}
-                                <div class="item-total-price">{{ currency }} Total Price: {{ "%.2f" % (price * item_count) }}</div>
-                                {% endif %}
-                            {% endfor %}
-                            <div><a href="{{ first_item.url }}" target="_blank">Product Link</a></div>
-                        </div>
-                    </div>
-                    {% endfor %}
-                </div>
-            </div>
-            {% endif %}
-            {% endfor %}
-        </div>
-    </body>
-    </html>
-    """
+def build_price_drops(data, price_drops):
+    drops = []
+    for (category, item_id), stats in (price_drops or {}).items():
+        item = data.get(category, {}).get(item_id)
+        if not item:
+            continue
+        drops.append({
+            'category': category,
+            'item': item,
+            'previous': stats['previous'],
+            'last': stats['last'],
+            'lowest': stats['min'],
+            'change': (stats['last'] - stats['previous']) / stats['previous'] * 100 if stats['previous'] else 0,
+            'changed_on': datetime.datetime.fromtimestamp(stats['last_change']).strftime("%d-%m-%Y")
+        })
+    drops.sort(key=lambda drop: drop['change'])
+    return drops
 
-    template = Template(html_template)
+def render_category(category, category_total, groups, base_currency, images=None):
+    template = get_environment().get_template('category.html')
     return template.render(
-        data=data, 
+        category=category,
+        category_total=category_total,
+        groups=groups,
+        base_currency=base_currency,
+        images=images or {}
+    )
+
+def render_category_fragments(data, prices, totals, rates, base_currency, report_cache=None, images=None):
+    images = images or {}
+    categories = [category for category, items in data.items() if items]
+    if report_cache is None:
+        grouped_items = group_items(data, prices, rates)
+        for category in categories:
+            yield render_category(category, totals[category], grouped_items[category], base_currency, images)
+        return
+
+    fragments = {}
+    fingerprints = {}
+    for category in categories:
+        category_images = {item['picture_url']: images[item['picture_url']] for item in data[category].values() if item.get('picture_url') in images}
+        fingerprints[category] = report_cache.category_fingerprint(category, data[category], totals[category], rates, base_currency, category_images)
+        fragments[category] = report_cache.get_fragment(fingerprints[category])
+
+    changed = {category: data[category] for category in categories if fragments[category] is None}
+    grouped_items = group_items(changed, prices, rates)
+    for category in categories:
+        if fragments[category] is None:
+            fragments[category] = render_category(category, totals[category], grouped_items[category], base_currency, images)
+            report_cache.store_fragment(fingerprints[category], fragments[category])
+        yield fragments[category]
+
+def generate_html(data, totals, base_currency, enable_conversion, target_currencies, rates=None, price_drops=None, report_cache=None, images=None, image_styles=None, prices=None):
+    timestamp = datetime.datetime.now().strftime("%d-%m-%Y %H:%M:%S")
+    
+    rates = rates if enable_conversion and rates else {}
+    prices = prices if prices is not None else parse_prices(data)
+    for total in totals.values():
+        if 'exchange_totals' not in total:
+            total['exchange_totals'] = convert_price(total['original_total'], rates)
+
+    template = get_environment().get_template('product_list.html')
+    stream = template.stream(
         totals=totals, 
         base_currency=base_currency, 
         target_currencies=target_currencies, 
         enable_conversion=enable_conversion,
         timestamp=timestamp, 
-        get_cached_exchange_prices=get_cached_exchange_prices
+        category_fragments=render_category_fragments(data, prices, totals, rates, base_currency, report_cache, images),
+        price_drops=build_price_drops(data, price_drops),
+        images=images or {},
+        image_styles=image_styles or {}
     )
+    stream.enable_buffering(64)
+    return stream
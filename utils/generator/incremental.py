@@ -0,0 +1,91 @@
+import hashlib
+import json
+import os
+from functools import lru_cache
+from utils.generator.html import TEMPLATES_DIR
+
+@lru_cache(maxsize=None)
+def get_templates_version():
+    digest = hashlib.sha256()
+    for file_name in sorted(os.listdir(TEMPLATES_DIR)):
+        with open(os.path.join(TEMPLATES_DIR, file_name), 'rb') as file:
+            digest.update(file_name.encode('utf-8'))
+            digest.update(file.read())
+    return digest.hexdigest()
+
+def fingerprint(*parts):
+    payload = json.dumps([get_templates_version(), *parts], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class ReportCache:
+    def __init__(self, directory='./db/report_cache'):
+        self.directory = directory
+        self.manifest_file = os.path.join(directory, 'manifest.json')
+        self.used_fragments = set()
+        self.rendered = 0
+        self.reused = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _fragment_path(self, category_fingerprint):
+        return os.path.join(self.directory, f"{category_fingerprint}.html")
+
+    def category_fingerprint(self, category, items, category_total, rates, base_currency, images=None):
+        return fingerprint(category, items, category_total, rates, base_currency, images or {})
+
+    def report_fingerprint(self, data, totals, rates, base_currency, price_drops, images=None, image_styles=None):
+        # only the fields shown in the report, the first and last seen times move with every rescan
+        drops = sorted(
+            (key, stats['previous'], stats['last'], stats['min'], stats['last_change'])
+            for key, stats in (price_drops or {}).items()
+        )
+        # embedded thumbnails are named by their content, so the names stand in for the data
+        return fingerprint(data, totals, rates, base_currency, drops, images or {}, sorted(image_styles or {}))
+
+    def get_fragment(self, category_fingerprint):
+        try:
+            with open(self._fragment_path(category_fingerprint), 'r', encoding='utf-8') as file:
+                fragment = file.read()
+        except FileNotFoundError:
+            return None
+        self.used_fragments.add(category_fingerprint)
+        self.reused += 1
+        return fragment
+
+    def store_fragment(self, category_fingerprint, fragment):
+        try:
+            with open(self._fragment_path(category_fingerprint), 'w', encoding='utf-8') as file:
+                file.write(fragment)
+        except IOError as e:
+            print(f"Error saving report fragment: {e}")
+            return
+        self.used_fragments.add(category_fingerprint)
+        self.rendered += 1
+
+    def load_manifest(self):
+        try:
+            with open(self.manifest_file, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def is_up_to_date(self, output_path, report_fingerprint):
+        return os.path.exists(output_path) and self.load_manifest().get(output_path) == report_fingerprint
+
+    def finish(self, output_path, report_fingerprint):
+        manifest = self.load_manifest()
+        manifest[output_path] = report_fingerprint
+        try:
+            with open(self.manifest_file, 'w', encoding='utf-8') as file:
+                json.dump(manifest, file)
+        except IOError as e:
+            print(f"Error saving report manifest: {e}")
+
+        for file_name in os.listdir(self.directory):
+            name, extension = os.path.splitext(file_name)
+            if extension == '.html' and name not in self.used_fragments:
+                os.remove(os.path.join(self.directory, file_name))
+
+def load_report_cache(export_config):
+    if not export_config.get('incremental', False):
+        return None
+    return ReportCache(export_config.get('cacheDirectory', './db/report_cache'))
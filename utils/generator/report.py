@@ -0,0 +1,66 @@
+import os
+from utils.config import load_config_section
+from utils.exchange_rate import get_conversion_rates
+from utils.generator.helpers import calculate_totals, parse_prices, save_html
+from utils.generator.html import generate_html
+from utils.generator.incremental import load_report_cache
+from utils.generator.thumbnails import load_thumbnail_cache
+from utils.history import days_ago
+from utils.metrics import timed
+from utils.store import get_store
+
+def export_report(base_currency, enable_conversion, target_currencies, output_path='product_list.html'):
+    store = get_store()
+    data = store.load_data()
+    if not data:
+        print("No data to export.")
+        return False
+
+    export_config = load_config_section('export')
+    with timed('exchange_rates'):
+        rates = get_conversion_rates(base_currency, target_currencies) if enable_conversion else {}
+    prices = parse_prices(data)
+    totals = calculate_totals(prices, rates)
+    price_drops = None
+    if export_config.get('priceDropReport', False):
+        price_drops = store.get_price_drops(days_ago(export_config.get('priceDropDays', 30)))
+
+    images, image_styles = {}, {}
+    thumbnail_config = export_config.get('thumbnails', {})
+    thumbnail_cache = load_thumbnail_cache(thumbnail_config)
+    if thumbnail_cache is not None:
+        picture_urls = [item.get('picture_url') for items in data.values() for item in items.values()]
+        rescan_config = load_config_section('rescan')
+        with timed('thumbnails'):
+            thumbnail_cache.fetch_missing(
+                picture_urls,
+                rescan_config.get('maxWorkers', 8),
+                rescan_config.get('domainConcurrency', {}),
+                rescan_config.get('defaultDomainConcurrency', 2),
+                int(thumbnail_config.get('maxImageSizeMB', 10) * 1024 * 1024)
+            )
+            images, image_styles = thumbnail_cache.report_images(
+                picture_urls,
+                os.path.dirname(os.path.abspath(output_path)),
+                thumbnail_config.get('embed', False)
+            )
+            thumbnail_cache.save(images)
+        if thumbnail_cache.downloaded or thumbnail_cache.failed:
+            print(f"{thumbnail_cache.downloaded} thumbnails made, {thumbnail_cache.failed} images could not be downloaded.")
+
+    report_cache = load_report_cache(export_config)
+    if report_cache is not None:
+        report_fingerprint = report_cache.report_fingerprint(data, totals, rates, base_currency, price_drops, images, image_styles)
+        if report_cache.is_up_to_date(output_path, report_fingerprint):
+            print(f"No changes since the last export. {output_path} is up to date.")
+            return True
+
+    with timed('render'):
+        html_content = generate_html(data, totals, base_currency, enable_conversion, target_currencies, rates, price_drops, report_cache, images, image_styles, prices)
+        save_html(html_content, output_path)
+
+    if report_cache is not None:
+        report_cache.finish(output_path, report_fingerprint)
+        print(f"{report_cache.rendered} categories rendered, {report_cache.reused} reused from the report cache.")
+    print("HTML report generated successfully.")
+    return True
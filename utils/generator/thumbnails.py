@@ -0,0 +1,174 @@
+import base64
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+from PIL import Image, UnidentifiedImageError
+from utils.helpers import fetch_product_page
+from utils.rescan import scan_concurrently
+
+class ThumbnailCache:
+    def __init__(self, directory='./db/thumbnails', max_size_bytes=50 * 1024 * 1024, size=200, quality=80):
+        self.directory = directory
+        self.max_size_bytes = max_size_bytes
+        self.size = size
+        self.quality = quality
+        self.index_file = os.path.join(directory, 'index.json')
+        # picture URL -> thumbnail file, and thumbnail file -> size; files are named by content so URLs can share one
+        self.entries = OrderedDict()
+        self.files = {}
+        self.total_size = 0
+        self.downloaded = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._load_index()
+
+    def _load_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as file:
+                index = json.load(file)
+        except FileNotFoundError:
+            return
+        except json.JSONDecodeError:
+            print(f"Error decoding thumbnail cache index: {self.index_file}")
+            return
+        if index.get('size') != self.size:
+            # thumbnails of another size are made again
+            for entry in index.get('entries', {}).values():
+                try:
+                    os.remove(self._file_path(entry['file']))
+                except FileNotFoundError:
+                    pass
+            return
+
+        for url, entry in sorted(index.get('entries', {}).items(), key=lambda item: item[1].get('last_access', 0)):
+            file_path = self._file_path(entry['file'])
+            if not os.path.exists(file_path):
+                continue
+            self.entries[url] = entry
+            if entry['file'] not in self.files:
+                self.files[entry['file']] = os.path.getsize(file_path)
+                self.total_size += self.files[entry['file']]
+
+    def _file_path(self, file_name):
+        return os.path.join(self.directory, file_name)
+
+    def make_thumbnail(self, content):
+        with Image.open(io.BytesIO(content)) as image:
+            # lets the JPEG decoder scale down while decoding instead of decoding the full picture
+            image.draft('RGB', (self.size, self.size))
+            image.thumbnail((self.size, self.size))
+            if image.mode != 'RGB':
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                background.paste(image.convert('RGBA'), mask=image.convert('RGBA'))
+                image = background
+            output = io.BytesIO()
+            image.save(output, 'JPEG', quality=self.quality, optimize=True)
+        return output.getvalue()
+
+    def download(self, url, max_bytes=None):
+        content = fetch_product_page(url, retries=2, max_bytes=max_bytes)
+        if not content:
+            return None
+        try:
+            thumbnail = self.make_thumbnail(content)
+        except (UnidentifiedImageError, OSError, ValueError) as e:
+            print(f"Error making a thumbnail of {url}: {e}")
+            return None
+        file_name = f"{hashlib.sha1(thumbnail).hexdigest()}.jpg"
+        with self._lock:
+            if file_name not in self.files:
+                try:
+                    with open(self._file_path(file_name), 'wb') as file:
+                        file.write(thumbnail)
+                except IOError as e:
+                    print(f"Error writing thumbnail of {url}: {e}")
+                    return None
+                self.files[file_name] = len(thumbnail)
+                self.total_size += len(thumbnail)
+            self.entries[url] = {'file': file_name, 'last_access': time.time()}
+        return file_name
+
+    def fetch_missing(self, urls, max_workers=8, domain_limits=None, default_domain_limit=2, max_bytes=None):
+        with self._lock:
+            missing = [url for url in dict.fromkeys(urls) if url and url not in self.entries]
+        if not missing:
+            return
+        print(f"Downloading {len(missing)} product images...")
+        results = scan_concurrently(
+            ((url, url) for url in missing),
+            partial(self.download, max_bytes=max_bytes),
+            max_workers,
+            domain_limits,
+            default_domain_limit
+        )
+        for url, file_name, error in results:
+            if file_name:
+                self.downloaded += 1
+            else:
+                self.failed += 1
+                if error:
+                    print(f"Error downloading {url}: {error}")
+
+    def report_images(self, urls, report_directory='.', embed=False):
+        # embedded thumbnails become one CSS class each, so a picture used by several items is inlined once
+        now = time.time()
+        images = {}
+        styles = {}
+        with self._lock:
+            for url in dict.fromkeys(urls):
+                entry = self.entries.get(url)
+                if entry is None:
+                    continue
+                entry['last_access'] = now
+                self.entries.move_to_end(url)
+                file_name = entry['file']
+                file_path = self._file_path(file_name)
+                if not embed:
+                    images[url] = {'src': os.path.relpath(file_path, report_directory).replace(os.sep, '/')}
+                    continue
+                css_class = f"thumb-{file_name[:16]}"
+                if css_class not in styles:
+                    with open(file_path, 'rb') as file:
+                        styles[css_class] = f"data:image/jpeg;base64,{base64.b64encode(file.read()).decode('ascii')}"
+                images[url] = {'css_class': css_class}
+        return images, styles
+
+    def _evict(self, keep=()):
+        while self.total_size > self.max_size_bytes and self.entries:
+            url = next(iter(self.entries))
+            if url in keep:
+                break
+            file_name = self.entries.pop(url)['file']
+            if any(entry['file'] == file_name for entry in self.entries.values()):
+                continue
+            self.total_size -= self.files.pop(file_name)
+            try:
+                os.remove(self._file_path(file_name))
+            except FileNotFoundError:
+                pass
+
+    def save(self, keep=()):
+        with self._lock:
+            # pictures of the report that was just written are the most recently used and are never evicted
+            self._evict(set(keep))
+            try:
+                with open(self.index_file, 'w', encoding='utf-8') as file:
+                    json.dump({'size': self.size, 'entries': self.entries}, file)
+            except IOError as e:
+                print(f"Error saving thumbnail cache index: {e}")
+
+def load_thumbnail_cache(thumbnail_config):
+    if not thumbnail_config.get('enabled', False):
+        return None
+    return ThumbnailCache(
+        thumbnail_config.get('directory', './db/thumbnails'),
+        int(thumbnail_config.get('maxSizeMB', 50) * 1024 * 1024),
+        thumbnail_config.get('size', 200),
+        thumbnail_config.get('quality', 80)
+    )
@@ -2,7 +2,15 @@ import json
 import requests
 import time
 from tqdm import tqdm
-from utils.constants import HEADERS
+from functools import partial
+from utils.cache import load_page_cache
+from utils.config import load_config_section
+from utils.constants import NOT_MODIFIED
+from utils.metrics import observe, record_response, timed, write_metrics
+from utils.session import get_session
+from utils.store import get_store
+from utils.rescan import scan_concurrently
+from utils.scheduler import FetchError, backoff_delay, load_scheduler, parse_retry_after
 
 def load_config():
     try:
@@ -21,57 +29,175 @@ def load_config():
         print(f"Error decoding config.json: {e}")
         return None, None, None, None, None
     
-def load_data(file_path):
-    try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            data = json.load(file)
-        return data
-    except FileNotFoundError:
-        print(f"File not found: {file_path}")
-        return {}
-    except json.JSONDecodeError:
-        print(f"Error decoding JSON from file: {file_path}")
-        return {}
+def read_response_body(response, consumer=None, chunk_size=65536, max_bytes=None):
+    if consumer is None and max_bytes is None:
+        return response.content, False
+
+    chunks = []
+    received = 0
+    for chunk in response.iter_content(chunk_size=chunk_size):
+        chunks.append(chunk)
+        received += len(chunk)
+        if consumer is not None:
+            with timed('parse.stream'):
+                complete = consumer.feed(chunk)
+            if complete:
+                break
+        if max_bytes is not None and received >= max_bytes:
+            print(f"Stopped reading {response.url} after {received} bytes (page size limit).")
+            return b''.join(chunks), True
+    return b''.join(chunks), False
 
-def fetch_product_page(url, retries=3, delay=5):
+def fetch_product_page(url, retries=3, delay=1, page_cache=None, consumer=None, chunk_size=65536, max_bytes=None, raise_errors=False):
+    headers = page_cache.conditional_headers(url) if page_cache is not None else None
+    stream = consumer is not None or max_bytes is not None
     for attempt in range(retries):
+        if consumer is not None:
+            consumer.reset()
         try:
-            response = requests.get(url, headers=HEADERS, timeout=10)
-            response.raise_for_status()
-            return response.content
+            with get_session().get(url, headers=headers, timeout=10, stream=stream) as response:
+                observe('fetch.headers', response.elapsed.total_seconds())
+                if page_cache is not None and response.status_code == 304:
+                    record_response(url, 304)
+                    page_cache.record_hit(url)
+                    return NOT_MODIFIED
+                response.raise_for_status()
+                with timed('fetch.body'):
+                    content, truncated = read_response_body(response, consumer, chunk_size, max_bytes)
+                record_response(url, response.status_code, len(content), response.raw.tell())
+            if page_cache is not None and truncated:
+                # the validators would vouch for a page that was never read in full
+                page_cache.discard(url)
+            elif page_cache is not None:
+                page_cache.store(url, response.headers, len(content))
+            return content
         except requests.RequestException as e:
+            response = getattr(e, 'response', None)
+            record_response(url, response.status_code if response is not None else 'error')
+            error = FetchError(
+                url,
+                str(e),
+                response.status_code if response is not None else None,
+                parse_retry_after(response.headers.get('Retry-After')) if response is not None else None
+            )
             print(f"Failed to retrieve the webpage (attempt {attempt + 1}): {e}")
-            time.sleep(delay)
+            if not error.retryable or attempt + 1 >= retries:
+                break
+            time.sleep(min(error.retry_after, 60) if error.retry_after is not None else backoff_delay(attempt, delay))
+    if raise_errors:
+        raise error
     print("Exceeded maximum retry attempts")
     return None
 
-def rescan_prices(data, determine_website_and_get_info):
+def rescan_prices(data, determine_website_and_get_info, max_workers=8, domain_limits=None, default_domain_limit=2, page_cache=None, store=None, scheduler=None, pipeline_config=None, distributed_config=None):
+    pipeline_config = pipeline_config or {}
     updated_data = data.copy()
     changes = False
-    for category, items in tqdm(data.items(), desc="Rescanning categories", unit="category"):
-        print(f"\nRescanning items in {category}...")
-        for item_id, item in tqdm(items.items(), desc="Rescanning items", unit="item", leave=False):
-            url = item['url']
-            try:
-                new_product_info = determine_website_and_get_info(url)
-                if new_product_info and new_product_info['price'] != item['price']:
+    updates = []
+    unchanged = []
+    not_modified_count = 0
+    batch_size = max(1, pipeline_config.get('storeBatchSize', 100))
+    # a product added several times is fetched once, its result is applied to every copy
+    copies = {}
+    for category, items in data.items():
+        for item_id, item in items.items():
+            copies.setdefault(item['url'], []).append((category, item_id))
+    tasks = [(keys[0], url) for url, keys in copies.items()]
+    item_count = sum(len(keys) for keys in copies.values())
+    if page_cache is not None:
+        for url, keys in copies.items():
+            # copies left at different prices by an earlier rescan need the full page to agree again
+            if len({data[category][item_id]['price'] for category, item_id in keys}) > 1:
+                page_cache.discard(url)
+    print(f"\nRescanning {item_count} items across {len(data)} categories...")
+    if distributed_config and distributed_config.get('enabled', False):
+        from utils.distributed import rescan_distributed
+        results = rescan_distributed(tasks, distributed_config)
+    elif pipeline_config.get('enabled', False):
+        from utils.pipeline import rescan_pipelined
+        results = rescan_pipelined(tasks, max_workers, domain_limits, default_domain_limit, page_cache, scheduler, pipeline_config)
+    else:
+        if page_cache is not None:
+            determine_website_and_get_info = partial(determine_website_and_get_info, page_cache=page_cache)
+        if scheduler is not None:
+            determine_website_and_get_info = partial(determine_website_and_get_info, retries=1, raise_errors=True)
+        results = scan_concurrently(tasks, determine_website_and_get_info, max_workers, domain_limits, default_domain_limit, scheduler)
+    def checkpoint():
+        if store is not None:
+            store.update_products(updates)
+            store.record_prices(unchanged)
+        updates.clear()
+        unchanged.clear()
+
+    # completed items are committed in batches, so an interrupted rescan can carry on from the last one
+    try:
+        for (category, item_id), new_product_info, error in tqdm(results, total=len(tasks), desc="Rescanning items", unit="item"):
+            url = data[category][item_id]['url']
+            if page_cache is not None and new_product_info is not NOT_MODIFIED:
+                # validators are only kept for pages that gave a product, a failed page is parsed again next time
+                if new_product_info:
+                    page_cache.confirm(url)
+                else:
+                    page_cache.discard(url)
+            for category, item_id in copies[url]:
+                item = data[category][item_id]
+                if error:
+                    print(f"\nFailed to rescan product {item['name']} from {item['url']}. Error: {error}")
+                elif new_product_info is NOT_MODIFIED:
+                    not_modified_count += 1
+                    unchanged.append((category, item_id, item['price'], item.get('currency')))
+                elif new_product_info and new_product_info['price'] != item['price']:
                     updated_data[category][item_id] = new_product_info
                     changes = True
+                    updates.append((category, item_id, new_product_info))
                     print(f"\nUpdated price for {item['name']} from {item['price']} to {new_product_info['price']}")
-            except Exception as e:
-                print(f"\nFailed to rescan product {item['name']} from {url}. Error: {e}")
+                elif new_product_info:
+                    unchanged.append((category, item_id, new_product_info['price'], new_product_info.get('currency')))
+            if len(updates) + len(unchanged) >= batch_size:
+                checkpoint()
+    finally:
+        checkpoint()
+    if page_cache is not None:
+        print(f"\n{not_modified_count} items served from cache (not modified), {item_count - not_modified_count} items needed a full fetch, "
+              f"{page_cache.bytes_saved / 1024:.1f} KB not downloaded.")
     return updated_data if changes else None
 
-def perform_rescan(determine_website_and_get_info):
-    data = load_data('./db/data.json')
+def perform_rescan(determine_website_and_get_info, max_age_hours=None):
+    store = get_store()
+    rescan_config = load_config_section('rescan')
+    if max_age_hours is None:
+        max_age_hours = rescan_config.get('skipCheckedWithinHours', 0)
+    started_at, resumed = store.begin_rescan(rescan_config.get('resumeWithinHours', 24) * 3600)
+    checked_before = started_at
+    if max_age_hours:
+        checked_before = min(checked_before, time.time() - max_age_hours * 3600)
+    data = store.load_data(checked_before)
     if not data:
-        print("No data to rescan.")
+        store.finish_rescan()
+        print("No data to rescan." if not max_age_hours else f"All products were rescanned in the last {max_age_hours} hours.")
         return
+    if resumed:
+        print(f"Resuming the rescan started at {time.strftime('%Y-%m-%d %H:%M', time.localtime(started_at))}, "
+              f"products rescanned since then are skipped.")
+    page_cache = load_page_cache(load_config_section('pageCache'))
     print("Rescanning prices...")
-    updated_data = rescan_prices(data, determine_website_and_get_info)
+    updated_data = rescan_prices(
+        data,
+        determine_website_and_get_info,
+        rescan_config.get('maxWorkers', 8),
+        rescan_config.get('domainConcurrency', {}),
+        rescan_config.get('defaultDomainConcurrency', 2),
+        page_cache,
+        store,
+        load_scheduler(),
+        load_config_section('pipeline'),
+        load_config_section('distributed')
+    )
+    store.finish_rescan()
+    if page_cache is not None:
+        page_cache.save()
     if updated_data:
-        with open('./db/data.json', 'w', encoding='utf-8') as file:
-            json.dump(updated_data, file, ensure_ascii=False, indent=4)
-        print("Prices rescanned and data.json updated successfully.")
+        print("Prices rescanned and the product store updated successfully.")
     else:
         print("No price changes detected during rescan.")
+    write_metrics('rescan')
@@ -0,0 +1,88 @@
+import os
+import struct
+import threading
+import time
+
+# product id, unix timestamp, price in hundredths, ISO currency code
+RECORD = struct.Struct('<IIq3s')
+
+def to_cents(price):
+    return int(round(float(price) * 100))
+
+class PriceHistory:
+    def __init__(self, path='./db/price_history.bin'):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def append(self, observations):
+        buffer = bytearray()
+        for product_id, observed_at, price, currency in observations:
+            buffer += RECORD.pack(
+                product_id,
+                int(observed_at),
+                to_cents(price),
+                (currency or '').encode('ascii', 'ignore')[:3]
+            )
+        if not buffer:
+            return
+        with self._lock:
+            with open(self.path, 'ab') as file:
+                file.write(buffer)
+
+    def records(self):
+        try:
+            with open(self.path, 'rb') as file:
+                content = file.read()
+        except FileNotFoundError:
+            return
+        usable = len(content) - len(content) % RECORD.size
+        for product_id, observed_at, cents, currency in RECORD.iter_unpack(memoryview(content)[:usable]):
+            yield product_id, observed_at, cents / 100, currency.rstrip(b'\0').decode('ascii') or None
+
+    def get_product_history(self, product_id):
+        return [(observed_at, price, currency) for record_id, observed_at, price, currency in self.records() if record_id == product_id]
+
+    def summarise(self):
+        summary = {}
+        for product_id, observed_at, price, currency in self.records():
+            stats = summary.get(product_id)
+            if stats is None:
+                summary[product_id] = {
+                    'min': price,
+                    'max': price,
+                    'last': price,
+                    'previous': None,
+                    'currency': currency,
+                    'first_seen': observed_at,
+                    'last_seen': observed_at,
+                    'last_change': None
+                }
+                continue
+
+            if price < stats['min']:
+                stats['min'] = price
+            if price > stats['max']:
+                stats['max'] = price
+            if price != stats['last']:
+                stats['previous'] = stats['last']
+                stats['last'] = price
+                stats['last_change'] = observed_at
+            stats['last_seen'] = observed_at
+            stats['currency'] = currency or stats['currency']
+        return summary
+
+    def get_price_drops(self, since=None):
+        drops = {}
+        for product_id, stats in self.summarise().items():
+            if stats['previous'] is None or stats['last'] >= stats['previous']:
+                continue
+            if since is not None and stats['last_change'] < since:
+                continue
+            drops[product_id] = stats
+        return drops
+
+def days_ago(days):
+    return time.time() - days * 86400
@@ -0,0 +1,194 @@
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+from urllib.parse import urlparse
+from utils.config import load_config_section
+
+# upper bounds in seconds, the last bucket (+Inf) is implicit
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(BUCKETS[index], self.max) if index < len(BUCKETS) else self.max
+        return self.max
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(BUCKETS + ('+Inf',), self.counts):
+            total += count
+            yield bound, total
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else None,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'buckets': {str(bound): count for bound, count in self.cumulative()}
+        }
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.stages = {}
+        self.domains = {}
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def record_response(self, url, status_code, decoded_bytes, wire_bytes):
+        domain = urlparse(url).hostname or ''
+        if domain.startswith('www.'):
+            domain = domain[4:]
+        with self.lock:
+            stats = self.domains.get(domain)
+            if stats is None:
+                stats = self.domains[domain] = {'requests': 0, 'decoded_bytes': 0, 'wire_bytes': 0, 'status_codes': {}}
+            stats['requests'] += 1
+            stats['decoded_bytes'] += decoded_bytes
+            stats['wire_bytes'] += wire_bytes
+            status = str(status_code)
+            stats['status_codes'][status] = stats['status_codes'].get(status, 0) + 1
+
+    def to_dict(self, run):
+        with self.lock:
+            return {
+                'run': run,
+                'started_at': self.started_at,
+                'finished_at': time.time(),
+                'stages': {stage: histogram.summary() for stage, histogram in sorted(self.stages.items())},
+                'domains': {domain: dict(stats, status_codes=dict(stats['status_codes'])) for domain, stats in sorted(self.domains.items())}
+            }
+
+    def to_prometheus(self, run):
+        lines = [
+            '# HELP scraper_stage_seconds Time spent in each stage of a scrape run.',
+            '# TYPE scraper_stage_seconds histogram'
+        ]
+        with self.lock:
+            for stage, histogram in sorted(self.stages.items()):
+                labels = f'run="{run}",stage="{stage}"'
+                for bound, count in histogram.cumulative():
+                    lines.append(f'scraper_stage_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'scraper_stage_seconds_sum{{{labels}}} {histogram.sum}')
+                lines.append(f'scraper_stage_seconds_count{{{labels}}} {histogram.count}')
+
+            lines += [
+                '# HELP scraper_requests_total HTTP responses received per domain and status code.',
+                '# TYPE scraper_requests_total counter'
+            ]
+            for domain, stats in sorted(self.domains.items()):
+                for status, count in sorted(stats['status_codes'].items()):
+                    lines.append(f'scraper_requests_total{{run="{run}",domain="{domain}",code="{status}"}} {count}')
+
+            lines += [
+                '# HELP scraper_response_bytes_total Response bytes per domain, as sent over the wire and after decompression.',
+                '# TYPE scraper_response_bytes_total counter'
+            ]
+            for domain, stats in sorted(self.domains.items()):
+                lines.append(f'scraper_response_bytes_total{{run="{run}",domain="{domain}",encoding="wire"}} {stats["wire_bytes"]}')
+                lines.append(f'scraper_response_bytes_total{{run="{run}",domain="{domain}",encoding="decoded"}} {stats["decoded_bytes"]}')
+        return '\n'.join(lines) + '\n'
+
+class StageTimer:
+    __slots__ = ('metrics', 'stage', 'start')
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+_metrics = None
+_null_timer = nullcontext()
+
+def enable_metrics():
+    global _metrics
+    _metrics = Metrics()
+    return _metrics
+
+def get_metrics():
+    return _metrics
+
+def load_metrics():
+    if load_config_section('metrics').get('enabled', False):
+        enable_metrics()
+    return _metrics
+
+def timed(stage):
+    if _metrics is None:
+        return _null_timer
+    return StageTimer(_metrics, stage)
+
+def observe(stage, seconds):
+    if _metrics is not None:
+        _metrics.observe(stage, seconds)
+
+def record_response(url, status_code, decoded_bytes=0, wire_bytes=0):
+    if _metrics is not None:
+        _metrics.record_response(url, status_code, decoded_bytes, wire_bytes)
+
+def write_file(file_path, content):
+    directory = os.path.dirname(file_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_file = f"{file_path}.tmp"
+    try:
+        with open(temp_file, 'w', encoding='utf-8') as file:
+            file.write(content)
+        os.replace(temp_file, file_path)
+    except IOError as e:
+        print(f"Error saving metrics to {file_path}: {e}")
+
+def write_metrics(run):
+    global _metrics
+    if _metrics is None or not (_metrics.stages or _metrics.domains):
+        return
+    metrics_config = load_config_section('metrics')
+    metrics, _metrics = _metrics, Metrics()
+    json_file = metrics_config.get('jsonFile', './db/metrics/{run}.json').format(run=run)
+    prometheus_file = metrics_config.get('prometheusFile', './db/metrics/{run}.prom').format(run=run)
+    if json_file:
+        write_file(json_file, json.dumps(metrics.to_dict(run), indent=2))
+    if prometheus_file:
+        write_file(prometheus_file, metrics.to_prometheus(run))
+    print(f"Timing report for the {run} run saved to {json_file or prometheus_file}.")
@@ -1,21 +1,70 @@
-from bs4 import BeautifulSoup
+from lxml import html
+from utils.config import load_config_section
+from utils.constants import NOT_MODIFIED
 from utils.helpers import fetch_product_page
-from utils.websites import get_ikea_product_info, get_elgiganten_product_info, get_trademax_product_info, get_chilli_product_info
+from utils.metrics import timed
+from utils.product.parser import get_structured_product_info, StreamingProductParser
+from utils.websites import get_site_extractor
 
-def determine_website_and_get_info(url):
-    content = fetch_product_page(url)
+def fetch_and_parse_streaming(url, site, page_cache, streaming_config, retries=3, raise_errors=False):
+    consumer = StreamingProductParser(url, site.has_fields)
+    content = fetch_product_page(
+        url,
+        retries=retries,
+        page_cache=page_cache,
+        consumer=consumer,
+        chunk_size=streaming_config.get('chunkSizeKB', 64) * 1024,
+        max_bytes=int(streaming_config.get('maxPageSizeMB', 8) * 1024 * 1024),
+        raise_errors=raise_errors
+    )
+    if content is NOT_MODIFIED:
+        return NOT_MODIFIED, None
     if not content:
-        return None
-    
-    soup = BeautifulSoup(content, 'html.parser')
-    if 'ikea.com' in url:
-        return get_ikea_product_info(url, soup)
-    elif 'elgiganten.se' in url:
-        return get_elgiganten_product_info(url, soup)
-    elif 'trademax.se' in url:
-        return get_trademax_product_info(url, soup)
-    elif 'chilli.se' in url:
-        return get_chilli_product_info(url, soup)
-    else:
+        return None, 'fetch failed'
+
+    if consumer.product_info:
+        return consumer.product_info, None
+
+    with timed('parse.page'):
+        tree = consumer.close()
+    if tree is None:
+        print(f"Failed to parse the page from {url}.")
+        return None, 'parse failed'
+    with timed('extract'):
+        product_info = site.extract(url, tree)
+    return product_info, None if product_info else 'extraction failed'
+
+def scrape_product(url, page_cache=None, retries=3, raise_errors=False):
+    with timed('scrape'):
+        return scrape_site_product(url, page_cache, retries, raise_errors)
+
+def scrape_site_product(url, page_cache, retries, raise_errors):
+    site = get_site_extractor(url)
+    if site is None:
         print("Unsupported website")
-        return None
+        return None, 'unsupported website'
+
+    streaming_config = load_config_section('streaming')
+    if streaming_config.get('enabled', False):
+        return fetch_and_parse_streaming(url, site, page_cache, streaming_config, retries, raise_errors)
+
+    content = fetch_product_page(url, retries=retries, page_cache=page_cache, raise_errors=raise_errors)
+    if content is NOT_MODIFIED:
+        return NOT_MODIFIED, None
+    if not content:
+        return None, 'fetch failed'
+
+    with timed('parse.head'):
+        product_info = get_structured_product_info(url, content)
+    if product_info:
+        return product_info, None
+
+    with timed('parse.page'):
+        tree = html.document_fromstring(content)
+    with timed('extract'):
+        product_info = site.extract(url, tree)
+    return product_info, None if product_info else 'extraction failed'
+
+def determine_website_and_get_info(url, page_cache=None, retries=3, raise_errors=False):
+    product_info, _ = scrape_product(url, page_cache, retries, raise_errors)
+    return product_info
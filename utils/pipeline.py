@@ -0,0 +1,114 @@
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from functools import partial
+from lxml import html
+from utils.config import load_config_section
+from utils.constants import NOT_MODIFIED
+from utils.helpers import fetch_product_page
+from utils.metrics import observe
+from utils.product.parser import HEAD_END_PATTERN, get_structured_product_info
+from utils.rescan import scan_concurrently
+from utils.websites import get_site_extractor
+
+STRUCTURED_DATA_PATTERN = re.compile(rb'application/ld\+json|product:price:amount|og:price:amount', re.IGNORECASE)
+
+class HeadSniffer:
+    def __init__(self, url):
+        self.url = url
+        self.reset()
+
+    def reset(self):
+        self.buffer = bytearray()
+        self.head_checked = False
+        self.product_info = None
+
+    def feed(self, chunk):
+        # the head is parsed here once, a page whose head holds the complete product never reaches the pool
+        self.buffer += chunk
+        if self.head_checked:
+            return False
+        head_end = HEAD_END_PATTERN.search(self.buffer, max(0, len(self.buffer) - len(chunk) - 16))
+        if head_end is None:
+            return False
+        self.head_checked = True
+        head = bytes(self.buffer[:head_end.end()])
+        if STRUCTURED_DATA_PATTERN.search(head) is not None:
+            self.product_info = get_structured_product_info(self.url, head)
+        return self.product_info is not None
+
+def download_page(url, streaming_config, page_cache=None, retries=3, raise_errors=False):
+    consumer = HeadSniffer(url)
+    content = fetch_product_page(
+        url,
+        retries=retries,
+        page_cache=page_cache,
+        consumer=consumer,
+        chunk_size=streaming_config.get('chunkSizeKB', 64) * 1024,
+        max_bytes=int(streaming_config.get('maxPageSizeMB', 8) * 1024 * 1024),
+        raise_errors=raise_errors
+    )
+    if content is NOT_MODIFIED:
+        return NOT_MODIFIED
+    if not content:
+        return None
+    return content, consumer.product_info
+
+def parse_page(url, content):
+    # the head was already checked for structured data while downloading
+    tree = html.document_fromstring(content)
+    return get_site_extractor(url).extract(url, tree)
+
+def warm_up_worker():
+    return os.getpid()
+
+def rescan_pipelined(tasks, max_workers=8, domain_limits=None, default_domain_limit=2, page_cache=None, scheduler=None, pipeline_config=None):
+    pipeline_config = pipeline_config or {}
+    parse_workers = pipeline_config.get('parseWorkers') or os.cpu_count() or 1
+    queue_size = max(1, pipeline_config.get('parseQueueSize', parse_workers * 4))
+    fetch_options = {'retries': 1, 'raise_errors': True} if scheduler is not None else {}
+    download = partial(download_page, streaming_config=load_config_section('streaming'), page_cache=page_cache, **fetch_options)
+
+    supported = []
+    for key, url in tasks:
+        if get_site_extractor(url) is None:
+            print(f"Unsupported website: {url}")
+            yield key, None, None
+        else:
+            supported.append((key, url))
+
+    with ProcessPoolExecutor(max_workers=parse_workers) as pool:
+        # start the workers before any download thread exists
+        pool.submit(warm_up_worker).result()
+        parsing = {}
+
+        def collect(timeout):
+            done, _ = wait(parsing, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                key, submitted_at = parsing.pop(future)
+                observe('parse.pool', time.perf_counter() - submitted_at)
+                try:
+                    product_info = future.result()
+                except Exception as e:
+                    yield key, None, e
+                    continue
+                yield key, product_info, None
+
+        urls = dict(supported)
+        downloads = scan_concurrently(supported, download, max_workers, domain_limits, default_domain_limit, scheduler)
+        for key, result, error in downloads:
+            if error or result is None or result is NOT_MODIFIED:
+                yield key, result, error
+                continue
+            content, product_info = result
+            if product_info is not None:
+                yield key, product_info, None
+                continue
+            while len(parsing) >= queue_size:
+                yield from collect(None)
+            parsing[pool.submit(parse_page, urls[key], content)] = (key, time.perf_counter())
+            yield from collect(0)
+
+        while parsing:
+            yield from collect(None)
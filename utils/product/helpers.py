@@ -1,9 +1,13 @@
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlparse
 import re
-import json
-import os
-def parse_price(price_str):
+import sqlite3
+from utils.store import get_store
+def parse_price(price_str, decimal_separator=None):
     try:
+        if decimal_separator:
+            price_str = re.sub(r'[^\d' + re.escape(decimal_separator) + ']', '', price_str)
+            return float(price_str.replace(decimal_separator, '.').strip('.'))
+
         price_str = re.sub(r'[^\d.,]', '', price_str)
         
         if re.search(r'\.\D|,\D', price_str):
@@ -27,28 +31,15 @@ def get_full_image_url(base_url, img_src):
         return urljoin(base_url, img_src)
     return img_src
 
-def save_product_info(product_info, category):
-    data_file = './db/data.json'
-    
-    try:
-        if os.path.exists(data_file) and os.path.getsize(data_file) > 0:
-            with open(data_file, 'r', encoding='utf-8') as file:
-                data = json.load(file)
-        else:
-            data = {}
-    except (FileNotFoundError, json.JSONDecodeError) as e:
-        print(f"Error loading data file: {e}")
-        data = {}
+def get_domain(url):
+    hostname = urlparse(url).hostname or ''
+    if hostname.startswith('www.'):
+        hostname = hostname[4:]
+    return hostname
 
-    if category not in data:
-        data[category] = {}
-
-    product_id = len(data[category]) + 1
-    data[category][product_id] = product_info
-    
+def save_product_info(product_info, category):
     try:
-        with open(data_file, 'w', encoding='utf-8') as file:
-            json.dump(data, file, ensure_ascii=False, indent=4)
-        print(f"Product information saved to {category} category in data.json")
-    except IOError as e:
-        print(f"Error saving product information to file: {e}")
\ No newline at end of file
+        get_store().add_product(category, product_info)
+        print(f"Product information saved to {category} category in the product store")
+    except sqlite3.Error as e:
+        print(f"Error saving product information to the product store: {e}")
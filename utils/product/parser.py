@@ -1,25 +1,33 @@
-from lxml import html
+import json
+import re
+from functools import lru_cache
+from lxml import etree, html
+from lxml.cssselect import CSSSelector
 from utils.product.helpers import parse_price, get_full_image_url
 
-def get_product_info(url, soup, name_selector, price_selector, img_selector):
-    name_tag = soup.select_one(name_selector)
-    price_tag = soup.select_one(price_selector)
-    img_tag = soup.select_one(img_selector)
+@lru_cache(maxsize=None)
+def compile_selector(selector):
+    return CSSSelector(selector)
 
-    if not name_tag:
+@lru_cache(maxsize=None)
+def compile_xpath(xpath):
+    return etree.XPath(xpath)
+
+def build_product_info(url, name_tag, price_tag, img_tag, currency=None, decimal_separator=None):
+    if name_tag is None:
         print(f"Failed to retrieve product name from {url}.")
         return None
 
-    if not price_tag:
+    if price_tag is None:
         print(f"Failed to retrieve product price from {url}.")
         return None
 
-    if not img_tag or not img_tag.has_attr('src'):
+    if img_tag is None or not img_tag.get('src'):
         print(f"Failed to retrieve product picture from {url}.")
         return None
 
-    name = name_tag.text.strip()
-    price = parse_price(price_tag.text.strip())
+    name = name_tag.text_content().strip()
+    price = parse_price(price_tag.text_content().strip(), decimal_separator)
     if price is None:
         print(f"Failed to parse the price for product from {url}.")
         return None
@@ -28,42 +36,140 @@ def get_product_info(url, soup, name_selector, price_selector, img_selector):
         'url': url,
         'name': name,
         'price': f"{price:.2f}",
-        'picture_url': img_tag['src']
+        'picture_url': get_full_image_url(url, img_tag.get('src'))
     }
+    if currency:
+        product_info['currency'] = currency
 
     return product_info
 
-def get_product_info_xpath(url, soup, name_xpath, price_xpath, img_xpath):
-    tree = html.fromstring(str(soup))
-    name_tag = tree.xpath(name_xpath)
-    price_tag = tree.xpath(price_xpath)
-    img_tag = tree.xpath(img_xpath)
+HEAD_END_PATTERN = re.compile(rb'</head\s*>', re.IGNORECASE)
 
-    if not name_tag:
-        print(f"Failed to retrieve product name from {url}.")
+def find_json_ld_product(data):
+    if isinstance(data, list):
+        for entry in data:
+            product = find_json_ld_product(entry)
+            if product:
+                return product
         return None
 
-    if not price_tag:
-        print(f"Failed to retrieve product price from {url}.")
+    if not isinstance(data, dict):
         return None
 
-    if not img_tag:
-        print(f"Failed to retrieve product picture from {url}.")
+    types = data.get('@type')
+    if types == 'Product' or (isinstance(types, list) and 'Product' in types):
+        return data
+    return find_json_ld_product(data.get('@graph', []))
+
+def first_value(value):
+    if isinstance(value, list):
+        value = value[0] if value else None
+    if isinstance(value, dict):
+        value = value.get('url') or value.get('contentUrl')
+    return value
+
+def text_value(value):
+    return value if isinstance(value, str) else None
+
+def read_json_ld(head):
+    for script in compile_xpath('//script[@type="application/ld+json"]')(head):
+        try:
+            product = find_json_ld_product(json.loads(script.text or ''))
+        except json.JSONDecodeError:
+            continue
+        if not product:
+            continue
+
+        offer = product.get('offers') or {}
+        if isinstance(offer, list):
+            offer = offer[0] if offer else {}
+        # fields of another shape than expected are left out, so the meta tags or the site selectors are used instead
+        if not isinstance(offer, dict):
+            offer = {}
+        price = offer.get('price', offer.get('lowPrice'))
+        return {
+            'name': text_value(product.get('name')),
+            'price': price if isinstance(price, (str, int, float)) else None,
+            'currency': text_value(offer.get('priceCurrency')),
+            'picture_url': text_value(first_value(product.get('image')))
+        }
+    return {}
+
+def read_meta_properties(head):
+    properties = {}
+    for meta in compile_xpath('//meta[@property and @content]')(head):
+        properties.setdefault(meta.get('property'), meta.get('content'))
+    return {
+        'name': properties.get('og:title'),
+        'price': properties.get('product:price:amount', properties.get('og:price:amount')),
+        'currency': properties.get('product:price:currency', properties.get('og:price:currency')),
+        'picture_url': properties.get('og:image')
+    }
+
+def get_structured_product_info_from_head(url, head):
+    fields = read_json_ld(head)
+    for key, value in read_meta_properties(head).items():
+        if not fields.get(key):
+            fields[key] = value
+
+    if not fields.get('name') or fields.get('price') is None or not fields.get('picture_url'):
         return None
 
-    name = name_tag[0].text.strip()
-    price = parse_price(price_tag[0].text.strip())
+    price = parse_price(str(fields['price']))
     if price is None:
-        print(f"Failed to parse the price for product from {url}.")
         return None
 
-    picture_url = get_full_image_url(url, img_tag[0].get('src'))
-
     product_info = {
         'url': url,
-        'name': name,
+        'name': fields['name'].strip(),
         'price': f"{price:.2f}",
-        'picture_url': picture_url
+        'picture_url': get_full_image_url(url, fields['picture_url'])
     }
+    if fields.get('currency'):
+        product_info['currency'] = fields['currency']
+
+    return product_info
+
+def get_structured_product_info(url, content):
+    head_end = HEAD_END_PATTERN.search(content)
+    if not head_end:
+        return None
+
+    head = html.document_fromstring(content[:head_end.end()])
+    return get_structured_product_info_from_head(url, head)
+
+def is_element_closed(element):
+    while element is not None:
+        if element.getnext() is not None:
+            return True
+        element = element.getparent()
+    return False
+
+class StreamingProductParser:
+    def __init__(self, url, has_fields):
+        self.url = url
+        self.has_fields = has_fields
+        self.reset()
+
+    def reset(self):
+        self.parser = etree.HTMLPullParser(events=('start', 'end'), tag=('html', 'head'))
+        self.parser.set_element_class_lookup(html.HtmlElementClassLookup())
+        self.root = None
+        self.product_info = None
+
+    def feed(self, chunk):
+        self.parser.feed(chunk)
+        for event, element in self.parser.read_events():
+            if event == 'start' and element.tag == 'html':
+                self.root = element
+            elif event == 'end' and element.tag == 'head':
+                self.product_info = get_structured_product_info_from_head(self.url, element)
+                if self.product_info:
+                    return True
+        return self.root is not None and self.has_fields(self.root)
 
-    return product_info
\ No newline at end of file
+    def close(self):
+        try:
+            return self.parser.close()
+        except etree.XMLSyntaxError:
+            return self.root
@@ -0,0 +1,93 @@
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from utils.product.helpers import get_domain
+from utils.scheduler import CircuitOpenError, FetchError, find_domain_setting
+
+def get_domain_limit(domain, domain_limits, default_limit):
+    domain, limit = find_domain_setting(domain, domain_limits, default_limit)
+    return domain, max(1, limit)
+
+def scan_concurrently(tasks, scan, max_workers=8, domain_limits=None, default_domain_limit=2, scheduler=None):
+    domain_limits = domain_limits or {}
+    max_workers = max(1, max_workers)
+
+    pending = OrderedDict()
+    limits = {}
+    for key, url in tasks:
+        domain, limit = get_domain_limit(get_domain(url), domain_limits, default_domain_limit)
+        pending.setdefault(domain, deque()).append((key, url, 0, 0.0))
+        limits[domain] = limit
+    in_flight = {domain: 0 for domain in pending}
+
+    def next_task(now):
+        for domain, queue in pending.items():
+            if not queue or in_flight[domain] >= limits[domain] or queue[0][3] > now:
+                continue
+            if scheduler is not None and not scheduler.acquire(domain):
+                continue
+            pending.move_to_end(domain)
+            in_flight[domain] += 1
+            return domain, queue.popleft()
+        return None, None
+
+    def next_ready_at(now):
+        ready_at = []
+        for domain, queue in pending.items():
+            if queue and in_flight[domain] < limits[domain]:
+                ready = queue[0][3]
+                if scheduler is not None:
+                    ready = max(ready, scheduler.ready_at(domain))
+                ready_at.append(ready)
+        return min(ready_at, default=None)
+
+    def drain_open_circuits():
+        for domain, queue in pending.items():
+            if queue and scheduler.is_open(domain):
+                while queue:
+                    key, url, _, _ = queue.popleft()
+                    yield key, None, CircuitOpenError(f"Skipped {url}, {domain} is failing")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        while True:
+            if scheduler is not None:
+                yield from drain_open_circuits()
+
+            while len(futures) < max_workers:
+                domain, task = next_task(time.monotonic())
+                if task is None:
+                    break
+                key, url, attempt, _ = task
+                futures[executor.submit(scan, url)] = (domain, key, url, attempt)
+
+            if not futures:
+                ready_at = next_ready_at(time.monotonic())
+                if ready_at is None:
+                    break
+                time.sleep(min(1.0, max(0.05, ready_at - time.monotonic())))
+                continue
+
+            ready_at = next_ready_at(time.monotonic())
+            timeout = None if ready_at is None else max(0.05, ready_at - time.monotonic())
+            done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                domain, key, url, attempt = futures.pop(future)
+                in_flight[domain] -= 1
+                try:
+                    result = future.result()
+                except FetchError as e:
+                    retry_in = scheduler.record_failure(domain, e, attempt) if scheduler is not None else None
+                    if retry_in is None:
+                        yield key, None, e
+                    else:
+                        pending[domain].append((key, url, attempt + 1, time.monotonic() + retry_in))
+                    continue
+                except Exception as e:
+                    if scheduler is not None:
+                        scheduler.record_error(domain)
+                    yield key, None, e
+                    continue
+                if scheduler is not None:
+                    scheduler.record_success(domain)
+                yield key, result, None
@@ -0,0 +1,216 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from utils.config import load_config_section
+
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+class FetchError(Exception):
+    def __init__(self, url, message, status_code=None, retry_after=None):
+        super().__init__(message)
+        self.url = url
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self):
+        return self.status_code is None or self.status_code in RETRYABLE_STATUS_CODES
+
+    @property
+    def throttled(self):
+        return self.status_code == 429 or (self.status_code == 503 and self.retry_after is not None)
+
+class CircuitOpenError(Exception):
+    pass
+
+def parse_retry_after(value, now=None):
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at - (time.time() if now is None else now))
+
+def backoff_delay(attempt, base=1.0, maximum=60.0):
+    return random.uniform(0, min(maximum, base * 2 ** attempt))
+
+def find_domain_setting(domain, settings, default):
+    for configured_domain, value in settings.items():
+        if domain == configured_domain or domain.endswith('.' + configured_domain):
+            return configured_domain, value
+    return domain, default
+
+class TokenBucket:
+    def __init__(self, rate, capacity=1, min_rate=None):
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.min_rate = min_rate if min_rate is not None else self.max_rate / 16
+        self.capacity = max(1.0, float(capacity))
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def ready_at(self, now):
+        self._refill(now)
+        if self.tokens >= 1:
+            return max(now, self.paused_until)
+        return max(now + (1 - self.tokens) / self.rate, self.paused_until)
+
+    def try_acquire(self, now):
+        if self.ready_at(now) > now:
+            return False
+        self.tokens -= 1
+        return True
+
+    def pause(self, seconds, now):
+        self.paused_until = max(self.paused_until, now + seconds)
+
+    def slow_down(self):
+        self.rate = max(self.min_rate, self.rate / 2)
+
+    def speed_up(self):
+        self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=120.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+
+    def allow(self, now):
+        if self.state == self.OPEN and now - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self.trial_in_flight = False
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trial_in_flight = False
+
+    def record_failure(self, now):
+        self.failures += 1
+        if self.state == self.OPEN:
+            return False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = now
+            self.trial_in_flight = False
+            return True
+        return False
+
+class DomainScheduler:
+    def __init__(self, requests_per_second=1.0, burst=2, domain_rates=None, max_attempts=3,
+                 backoff_base=1.0, backoff_max=60.0, failure_threshold=5, reset_timeout=120.0):
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.domain_rates = domain_rates or {}
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.buckets = {}
+        self.breakers = {}
+        self.lock = threading.Lock()
+
+    def _bucket(self, domain):
+        bucket = self.buckets.get(domain)
+        if bucket is None:
+            _, rate = find_domain_setting(domain, self.domain_rates, self.requests_per_second)
+            bucket = self.buckets[domain] = TokenBucket(rate, self.burst)
+        return bucket
+
+    def _breaker(self, domain):
+        breaker = self.breakers.get(domain)
+        if breaker is None:
+            breaker = self.breakers[domain] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return breaker
+
+    def is_open(self, domain):
+        with self.lock:
+            breaker = self._breaker(domain)
+            return breaker.state == CircuitBreaker.OPEN and time.monotonic() - breaker.opened_at < breaker.reset_timeout
+
+    def ready_at(self, domain):
+        with self.lock:
+            return self._bucket(domain).ready_at(time.monotonic())
+
+    def acquire(self, domain):
+        with self.lock:
+            now = time.monotonic()
+            bucket = self._bucket(domain)
+            if bucket.ready_at(now) > now:
+                return False
+            if not self._breaker(domain).allow(now):
+                return False
+            return bucket.try_acquire(now)
+
+    def record_success(self, domain):
+        with self.lock:
+            self._breaker(domain).record_success()
+            self._bucket(domain).speed_up()
+
+    def record_error(self, domain):
+        # the page came back but could not be used, which says nothing about the website's health;
+        # only a half-open trial is given back so the next request can test the website
+        with self.lock:
+            self._breaker(domain).trial_in_flight = False
+
+    def record_failure(self, domain, error, attempt):
+        with self.lock:
+            now = time.monotonic()
+            bucket = self._bucket(domain)
+            breaker = self._breaker(domain)
+            if error.throttled:
+                bucket.slow_down()
+                if error.retry_after is not None:
+                    bucket.pause(min(error.retry_after, self.backoff_max), now)
+                breaker.trial_in_flight = False
+            elif not error.retryable:
+                breaker.record_success()
+            elif breaker.record_failure(now):
+                print(f"\nToo many failures from {domain}, pausing requests to it for {self.reset_timeout:.0f}s.")
+
+        if not error.retryable or attempt + 1 >= self.max_attempts:
+            return None
+        delay = backoff_delay(attempt, self.backoff_base, self.backoff_max)
+        if error.retry_after is not None:
+            delay = max(delay, min(error.retry_after, self.backoff_max))
+        return delay
+
+def load_scheduler(scheduler_class=DomainScheduler, **options):
+    scheduler_config = load_config_section('scheduler')
+    circuit_config = scheduler_config.get('circuitBreaker', {})
+    return scheduler_class(
+        requests_per_second=scheduler_config.get('requestsPerSecond', 1.0),
+        burst=scheduler_config.get('burst', 2),
+        domain_rates=scheduler_config.get('domainRequestsPerSecond', {}),
+        max_attempts=scheduler_config.get('maxAttempts', 3),
+        backoff_base=scheduler_config.get('backoffBaseSeconds', 1.0),
+        backoff_max=scheduler_config.get('backoffMaxSeconds', 60.0),
+        failure_threshold=circuit_config.get('failureThreshold', 5),
+        reset_timeout=circuit_config.get('resetSeconds', 120.0),
+        **options
+    )
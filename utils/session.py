@@ -0,0 +1,38 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import make_headers
+from utils.config import load_config_section
+from utils.constants import HEADERS
+
+_session = None
+_session_lock = threading.Lock()
+
+def create_session(pool_connections=10, pool_maxsize=16, max_retries=0):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=max_retries)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update(HEADERS)
+    session.headers.update(make_headers(accept_encoding=True, keep_alive=True))
+    return session
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                http_config = load_config_section('http')
+                _session = create_session(
+                    http_config.get('poolConnections', 10),
+                    http_config.get('poolMaxsize', 16),
+                    http_config.get('maxRetries', 0)
+                )
+    return _session
+
+def close_session():
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
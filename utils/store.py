@@ -0,0 +1,263 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from utils.config import load_config_section
+from utils.history import PriceHistory
+from utils.metrics import timed
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS categories (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    category_id INTEGER NOT NULL REFERENCES categories(id),
+    item_id INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    name TEXT NOT NULL,
+    price REAL NOT NULL,
+    currency TEXT,
+    picture_url TEXT,
+    updated_at REAL NOT NULL,
+    checked_at REAL,
+    UNIQUE (category_id, item_id)
+);
+CREATE INDEX IF NOT EXISTS idx_products_url ON products(url);
+"""
+
+def parse_stored_price(price):
+    return float(str(price).split()[0])
+
+class ProductStore:
+    def __init__(self, path='./db/products.sqlite3', history_path='./db/price_history.bin'):
+        self.path = path
+        self.history = PriceHistory(history_path)
+        self._pending_observations = []
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        with self._lock:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('PRAGMA synchronous=NORMAL')
+            self.connection.execute('PRAGMA foreign_keys=ON')
+            self.connection.executescript(SCHEMA)
+
+    def _flush_observations(self):
+        observations, self._pending_observations = self._pending_observations, []
+        self.history.append(observations)
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+    def _category_id(self, category):
+        row = self.connection.execute('SELECT id FROM categories WHERE name = ?', (category,)).fetchone()
+        if row:
+            return row['id']
+        return self.connection.execute('INSERT INTO categories (name) VALUES (?)', (category,)).lastrowid
+
+    def _next_item_id(self, category_id):
+        row = self.connection.execute(
+            'SELECT COALESCE(MAX(item_id), 0) + 1 AS next_id FROM products WHERE category_id = ?',
+            (category_id,)
+        ).fetchone()
+        return row['next_id']
+
+    def _insert_product(self, category_id, item_id, product_info, now):
+        price = parse_stored_price(product_info['price'])
+        product_id = self.connection.execute(
+            'INSERT INTO products (category_id, item_id, url, name, price, currency, picture_url, updated_at, checked_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (category_id, item_id, product_info['url'], product_info['name'], price,
+             product_info.get('currency'), product_info.get('picture_url'), now, now)
+        ).lastrowid
+        self._record_observation(product_id, price, product_info.get('currency'), now)
+        return product_id
+
+    def _record_observation(self, product_id, price, currency, now):
+        self._pending_observations.append((product_id, now, price, currency))
+
+    def add_products(self, category, products):
+        now = time.time()
+        with self._lock, timed('store.add'):
+            self._pending_observations = []
+            with self.connection:
+                category_id = self._category_id(category)
+                item_id = self._next_item_id(category_id)
+                item_ids = []
+                for product_info in products:
+                    self._insert_product(category_id, item_id, product_info, now)
+                    item_ids.append(str(item_id))
+                    item_id += 1
+            self._flush_observations()
+        return item_ids
+
+    def add_product(self, category, product_info):
+        return self.add_products(category, [product_info])[0]
+
+    def update_products(self, updates):
+        now = time.time()
+        with self._lock, timed('store.update'):
+            self._pending_observations = []
+            with self.connection:
+                for category, item_id, product_info in updates:
+                    category_id = self._category_id(category)
+                    row = self.connection.execute(
+                        'SELECT id FROM products WHERE category_id = ? AND item_id = ?',
+                        (category_id, int(item_id))
+                    ).fetchone()
+                    if row is None:
+                        self._insert_product(category_id, int(item_id), product_info, now)
+                        continue
+
+                    price = parse_stored_price(product_info['price'])
+                    self.connection.execute(
+                        'UPDATE products SET url = ?, name = ?, price = ?, currency = ?, picture_url = ?, updated_at = ?, checked_at = ? '
+                        'WHERE id = ?',
+                        (product_info['url'], product_info['name'], price, product_info.get('currency'),
+                         product_info.get('picture_url'), now, now, row['id'])
+                    )
+                    self._record_observation(row['id'], price, product_info.get('currency'), now)
+            self._flush_observations()
+
+    def load_data(self, checked_before=None):
+        query = (
+            'SELECT c.name AS category, p.item_id, p.url, p.name, p.price, p.currency, p.picture_url '
+            'FROM products p JOIN categories c ON c.id = p.category_id '
+        )
+        parameters = ()
+        if checked_before is not None:
+            query += 'WHERE p.checked_at IS NULL OR p.checked_at < ? '
+            parameters = (checked_before,)
+        with self._lock, timed('store.load'):
+            rows = self.connection.execute(query + 'ORDER BY c.id, p.item_id', parameters).fetchall()
+
+        data = {}
+        for row in rows:
+            product_info = {
+                'url': row['url'],
+                'name': row['name'],
+                'price': f"{row['price']:.2f}",
+                'picture_url': row['picture_url']
+            }
+            if row['currency']:
+                product_info['currency'] = row['currency']
+            data.setdefault(row['category'], {})[str(row['item_id'])] = product_info
+        return data
+
+    def _product_ids(self):
+        rows = self.connection.execute(
+            'SELECT p.id, c.name AS category, p.item_id FROM products p JOIN categories c ON c.id = p.category_id'
+        ).fetchall()
+        return {(row['category'], str(row['item_id'])): row['id'] for row in rows}
+
+    def record_prices(self, observations):
+        now = time.time()
+        with self._lock, timed('store.history'):
+            self._pending_observations = []
+            with self.connection:
+                for category, item_id, price, currency in observations:
+                    row = self.connection.execute(
+                        'SELECT p.id FROM products p JOIN categories c ON c.id = p.category_id '
+                        'WHERE c.name = ? AND p.item_id = ?',
+                        (category, int(item_id))
+                    ).fetchone()
+                    if row is None:
+                        continue
+                    self.connection.execute('UPDATE products SET checked_at = ? WHERE id = ?', (now, row['id']))
+                    self._record_observation(row['id'], parse_stored_price(price), currency, now)
+            self._flush_observations()
+
+    def begin_rescan(self, resume_within=None):
+        with self._lock:
+            now = time.time()
+            row = self.connection.execute("SELECT value FROM meta WHERE key = 'rescan_started_at'").fetchone()
+            # an interrupted rescan that is too old is started over, its products are stale again by now
+            if row and (resume_within is None or now - float(row['value']) <= resume_within):
+                return float(row['value']), True
+            with self.connection:
+                self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('rescan_started_at', ?)", (repr(now),))
+            return now, False
+
+    def finish_rescan(self):
+        with self._lock:
+            with self.connection:
+                self.connection.execute("DELETE FROM meta WHERE key = 'rescan_started_at'")
+
+    def get_price_summary(self):
+        with self._lock:
+            product_ids = self._product_ids()
+        summary = self.history.summarise()
+        return {key: summary[product_id] for key, product_id in product_ids.items() if product_id in summary}
+
+    def get_price_drops(self, since=None):
+        with self._lock:
+            product_ids = self._product_ids()
+        drops = self.history.get_price_drops(since)
+        return {key: drops[product_id] for key, product_id in product_ids.items() if product_id in drops}
+
+    def import_json(self, file_path):
+        with self._lock:
+            if self.connection.execute("SELECT 1 FROM meta WHERE key = 'json_imported'").fetchone():
+                return 0
+
+            imported = 0
+            self._pending_observations = []
+            data = {}
+            if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
+                try:
+                    with open(file_path, 'r', encoding='utf-8') as file:
+                        data = json.load(file)
+                except json.JSONDecodeError:
+                    print(f"Error decoding JSON from file: {file_path}")
+                    return 0
+            now = time.time()
+            with self.connection:
+                for category, items in data.items():
+                    category_id = self._category_id(category)
+                    next_item_id = self._next_item_id(category_id)
+                    for item_id, product_info in items.items():
+                        item_id = int(item_id) if str(item_id).isdigit() else next_item_id
+                        next_item_id = max(next_item_id, item_id + 1)
+                        self._insert_product(category_id, item_id, product_info, now)
+                        imported += 1
+                self.connection.execute("INSERT INTO meta (key, value) VALUES ('json_imported', ?)", (file_path,))
+            self._flush_observations()
+
+            if imported:
+                print(f"Imported {imported} products from {file_path} into {self.path}.")
+            return imported
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                storage_config = load_config_section('storage')
+                store = ProductStore(
+                    storage_config.get('path', './db/products.sqlite3'),
+                    storage_config.get('priceHistory', './db/price_history.bin')
+                )
+                store.import_json(storage_config.get('importJson', './db/data.json'))
+                _store = store
+    return _store
+
+def close_store():
+    global _store
+    with _store_lock:
+        if _store is not None:
+            _store.close()
+            _store = None
@@ -1,53 +1,112 @@
-from utils.product.parser import get_product_info, get_product_info_xpath
-
-def get_ikea_product_info(url, soup):
-    name_selector = 'span.pip-header-section__description-text'
-    price_selector = 'span.pip-temp-price__integer'
-    img_selector = 'img.pip-image'
-
-    return get_product_info(
-        url, 
-        soup, 
-        name_selector,
-        price_selector,
-        img_selector
-    )
-
-def get_elgiganten_product_info(url, soup):
-    name_selector = 'span.font-regular.font-bold.xl\\:text-4xl.text-xl'
-    price_selector = 'span.font-headline.text-\\[3\\.5rem\\].leading-\\[3\\.5rem\\].inc-vat'
-    img_selector = 'li.items-center.flex.snap-start.pb-10 img'
-
-    return get_product_info(
-        url, 
-        soup, 
-        name_selector,
-        price_selector,
-        img_selector
-    )
-
-def get_trademax_product_info(url, soup):
-    name_xpath = '/html/body/div[1]/div/main/div[2]/div[2]/div[1]/h1'
-    price_xpath = '/html/body/div[1]/div/main/div[2]/div[2]/div[1]/div[2]/div/div/div'
-    img_xpath = '/html/body/div[1]/div/main/div[2]/div[1]/div/div[2]/div[1]/div/div/div[1]/img'
-
-    return get_product_info_xpath(
-        url,
-        soup,
-        name_xpath,
-        price_xpath,
-        img_xpath
-    )
-
-def get_chilli_product_info(url, soup):
-    name_xpath = '/html/body/div[1]/div/main/div[2]/div[2]/div[1]/h1'
-    price_xpath = '/html/body/div[1]/div/main/div[2]/div[2]/div[1]/div[2]/div[2]/span[2]'
-    img_xpath = '/html/body/div[1]/div/main/div[2]/div[1]/div/div[2]/div[1]/div/div/div[1]/img'
-
-    return get_product_info_xpath(
-        url,
-        soup,
-        name_xpath,
-        price_xpath,
-        img_xpath
-    )
+import json
+import os
+from functools import lru_cache
+from cssselect import SelectorError
+from lxml import etree
+from utils.config import load_config_section
+from utils.product.helpers import get_domain
+from utils.product.parser import build_product_info, compile_selector, compile_xpath, is_element_closed
+
+FIELDS = ('name', 'price', 'picture')
+
+DEFINITION_ERRORS = (KeyError, TypeError, AttributeError, ValueError, SelectorError, etree.XPathSyntaxError)
+
+def normalise_domain(domain):
+    domain = domain.strip().lower()
+    if domain.startswith('www.'):
+        domain = domain[4:]
+    return domain
+
+class SiteExtractor:
+    def __init__(self, name, domains, selector_type, selectors, currency=None, decimal_separator=None):
+        if selector_type not in ('css', 'xpath'):
+            raise ValueError(f"Unknown selector type '{selector_type}'")
+        missing = [field for field in FIELDS if not selectors.get(field)]
+        if missing:
+            raise ValueError(f"Missing selectors for {', '.join(missing)}")
+
+        compile_locator = compile_selector if selector_type == 'css' else compile_xpath
+        self.name = name
+        self.domains = tuple(normalise_domain(domain) for domain in domains)
+        self.selector_type = selector_type
+        self.locators = tuple(compile_locator(selectors[field]) for field in FIELDS)
+        self.currency = currency
+        self.decimal_separator = decimal_separator
+
+    def find_fields(self, tree):
+        fields = []
+        for locator in self.locators:
+            matches = locator(tree)
+            fields.append(matches[0] if matches else None)
+        return fields
+
+    def has_fields(self, tree):
+        for element in self.find_fields(tree):
+            if element is None or not is_element_closed(element):
+                return False
+        return True
+
+    def extract(self, url, tree):
+        name_tag, price_tag, img_tag = self.find_fields(tree)
+        return build_product_info(url, name_tag, price_tag, img_tag, self.currency, self.decimal_separator)
+
+    @classmethod
+    def from_definition(cls, definition):
+        return cls(
+            definition['site'],
+            definition['domains'],
+            definition.get('selectorType', 'css'),
+            definition['selectors'],
+            definition.get('currency'),
+            definition.get('decimalSeparator')
+        )
+
+class SiteRegistry:
+    def __init__(self):
+        self.extractors = {}
+
+    def register(self, extractor):
+        for domain in extractor.domains:
+            self.extractors[domain] = extractor
+
+    def lookup(self, url):
+        domain = get_domain(url)
+        while domain:
+            extractor = self.extractors.get(domain)
+            if extractor is not None:
+                return extractor
+            domain = domain.partition('.')[2]
+        return None
+
+    def load_file(self, file_path):
+        try:
+            with open(file_path, 'r', encoding='utf-8') as file:
+                definition = json.load(file)
+            self.register(SiteExtractor.from_definition(definition))
+        except (IOError, json.JSONDecodeError) + DEFINITION_ERRORS as e:
+            print(f"Error loading site definition {file_path}: {e}")
+
+    def load_directory(self, directory):
+        try:
+            file_names = sorted(os.listdir(directory))
+        except FileNotFoundError:
+            print(f"Site definitions directory not found: {directory}")
+            return
+        for file_name in file_names:
+            if file_name.endswith('.json'):
+                self.load_file(os.path.join(directory, file_name))
+
+@lru_cache(maxsize=None)
+def get_site_registry():
+    sites_config = load_config_section('sites')
+    registry = SiteRegistry()
+    registry.load_directory(sites_config.get('directory', './sites'))
+    for definition in sites_config.get('extractors', []):
+        try:
+            registry.register(SiteExtractor.from_definition(definition))
+        except DEFINITION_ERRORS as e:
+            print(f"Error loading site definition {definition}: {e}")
+    return registry
+
+def get_site_extractor(url):
+    return get_site_registry().lookup(url)